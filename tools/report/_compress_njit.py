@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Numba kernel for loop-iteration compression (optional).
+
+Same algorithm as cond_utils.compress_indices, over integer columns: per-event
+hash ids (equal ids <=> equal cond_hash), LOOP flags and raw val truthiness as
+uint8. numpy and numba are imported, and the kernel compiled, on the first
+call only, so runs that never see a long sequence pay nothing for them. When
+they are not importable or compilation fails, compress_indices_nb returns None
+and callers use the pure-Python version.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("brinfo_report")
+
+np: Any = None
+# Compiled _compress once built; False once building it has failed
+_kernel: Any = None
+
+
+def _compress(hid, loop, val):
+    """Kept indices (int32) of the events, hid being dense ids 0..u-1."""
+    n = hid.shape[0]
+    u = 0
+    for p in range(n):
+        if hid[p] + 1 > u:
+            u = hid[p] + 1
+    # next_head[i]: next loop event after i with the same hash id, n if none
+    last = np.full(u, n, dtype=np.int64)
+    next_head = np.full(n, n, dtype=np.int64)
+    for p in range(n - 1, -1, -1):
+        if loop[p]:
+            next_head[p] = last[hid[p]]
+            last[hid[p]] = p
+
+    # positions of raw-False loop events (exits), ascending, grouped by
+    # hash id: those of id h are ex[off[h]:off[h + 1]]
+    off = np.zeros(u + 1, dtype=np.int64)
+    for p in range(n):
+        if loop[p] and not val[p]:
+            off[hid[p] + 1] += 1
+    for h in range(u):
+        off[h + 1] += off[h]
+    fill = off[:u].copy()
+    ex = np.empty(off[u], dtype=np.int64)
+    for p in range(n):
+        if loop[p] and not val[p]:
+            ex[fill[hid[p]]] = p
+            fill[hid[p]] += 1
+
+    out = np.empty(n, dtype=np.int32)
+    m = 0
+    # pending [lo, hi) ranges; every entered loop head pushes at most two
+    st_lo = np.empty(2 * n + 1, dtype=np.int64)
+    st_hi = np.empty(2 * n + 1, dtype=np.int64)
+    st_lo[0] = 0
+    st_hi[0] = n
+    sp = 1
+    while sp > 0:
+        sp -= 1
+        i = st_lo[sp]
+        hi = st_hi[sp]
+        while i < hi:
+            out[m] = i
+            m += 1
+            if not loop[i] or not val[i]:
+                i += 1
+                continue
+            h = hid[i]
+            j = min(next_head[i], hi)
+            # last exit of this head in [j, hi), by binary search
+            resume = j
+            q = off[h] + np.searchsorted(ex[off[h]:off[h + 1]], hi) - 1
+            if q >= off[h] and ex[q] >= j:
+                resume = ex[q] + 1
+            if j > i + 1:
+                st_lo[sp] = resume
+                st_hi[sp] = hi
+                sp += 1
+                st_lo[sp] = i + 1
+                st_hi[sp] = j
+                sp += 1
+                break
+            i = resume
+    return out[:m]
+
+
+def _build_kernel() -> Any:
+    """Import numpy/numba and compile _compress; False if they are not importable."""
+    global np
+    try:
+        import numpy
+        from numba import njit
+    except ImportError:  # optional acceleration; fall back to pure Python
+        return False
+    np = numpy
+    # Not cached on disk, like the kernels of approx_match (see _align_kernel there)
+    kernel = njit(boundscheck=False)(_compress)
+    kernel(np.zeros(1, dtype=np.int32), np.ones(1, dtype=np.uint8), np.ones(1, dtype=np.uint8))
+    return kernel
+
+
+def compress_indices_nb(hashes: List[Any], loop: bytearray, val: bytearray) -> Optional[List[int]]:
+    """Kept indices for hashes and uint8 loop/val columns; None without the kernel."""
+    global _kernel
+    if _kernel is None:
+        try:
+            _kernel = _build_kernel()
+        except Exception as exc:
+            logger.warning("compression kernel unavailable, compressing in pure Python: %s", exc)
+            _kernel = False
+    if _kernel is False:
+        return None
+    ids: Dict[Any, int] = {}
+    hid = np.array([ids.setdefault(h, len(ids)) for h in hashes], dtype=np.int32)
+    return _kernel(hid, np.frombuffer(loop, dtype=np.uint8),
+                   np.frombuffer(val, dtype=np.uint8)).tolist()
@@ -19,19 +19,33 @@ Design highlights:
 - Prefilter candidates by sid set Jaccard similarity to limit DP cost.
 - Sequence alignment (Needleman-Wunsch-like) over (sid, valEff) pairs.
 - Auxiliary LCP/LCS metrics for tie-breaking and explainability.
+- sids are interned to ints and packed with valEff into one int key; when
+  numpy+numba are importable the alignment DP runs as a compiled kernel,
+  otherwise the same code runs as pure Python.
 
 Note: This module does not modify brinfo_report; integration is expected to
 be optional (flags: --approx-match/--approx-topk/--approx-threshold) and
-invoke ApproxMatcher.match(...) after exact matching yields zero results.
+invoke ApproxMatcher.match(...) after exact matching yields zero results
+(or ApproxMatcher.match_batch(...) for several invocations of one function).
 Matching is restricted to static chains under the same func_hash; if func_hash
 is missing or not found in meta, no approximate results are produced.
 """
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple, Set, Iterable
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Iterable
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:  # optional acceleration; fall back to pure Python
+    np = None  # type: ignore
+    njit = None  # type: ignore
 
 JsonObj = Dict[str, Any]
 
+logger = logging.getLogger("brinfo_report")
+
 
 # -----------------------
 # Utilities and encodings
@@ -44,18 +58,84 @@ def _sid(kind: Optional[str], norm: Optional[str]) -> str:
 
 
 def _val_eff(ev: JsonObj) -> bool:
-    return bool(ev.get("val")) ^ bool(ev.get("norm_flip"))
+    try:
+        return ev["_eff"]  # stamped by stamp_cond or CondColumns.events
+    except KeyError:
+        return bool(ev.get("val")) ^ bool(ev.get("norm_flip"))
 
 
-def _kind_weight(kind: Optional[str]) -> float:
-    k = (kind or "").upper()
-    if k == "LOOP":
-        return 2.0
-    if k in ("IF",):
-        return 1.0
-    if k in ("CASE", "DEFAULT"):
-        return 0.5
-    return 1.0
+# Condition kinds with a dedicated weight; anything else maps to kind id 0.
+_KIND_IDS: Dict[str, int] = {"LOOP": 1, "IF": 2, "CASE": 3, "DEFAULT": 4}
+# Alignment weight indexed by kind id
+_KIND_WEIGHTS: Tuple[float, ...] = (1.0, 2.0, 1.0, 0.5, 0.5)
+
+_KIND_WEIGHT_LUT = np.array(_KIND_WEIGHTS, dtype=np.float32) if np is not None else None
+
+
+def _kind_id(kind: Optional[str]) -> int:
+    return _KIND_IDS.get((kind or "").upper(), 0)
+
+
+def _pack_keys(sid_ids: List[int], vals: List[bool]) -> List[int]:
+    """(sid id, val) -> sid_id << 1 | val, so one compare tests both fields.
+
+    key >> 1 recovers the sid id (negative ids included, the shift is
+    arithmetic), so sid-only equality is (a >> 1) == (b >> 1).
+    """
+    return [sid_id << 1 | v for sid_id, v in zip(sid_ids, vals)]
+
+
+def _as_arrays(keys: List[int], kind_ids: List[int]) -> Tuple[Any, Any, Any]:
+    """Pack a sequence into contiguous SoA buffers.
+
+    Returns (int64 packed keys, int8 kind ids, float32 kind weights).
+    Without numpy plain lists are returned; the alignment kernel accepts both.
+    """
+    if np is None:
+        return keys, kind_ids, [_KIND_WEIGHTS[k] for k in kind_ids]
+    kind_arr = np.asarray(kind_ids, dtype=np.int8)
+    return (np.asarray(keys, dtype=np.int64),
+            kind_arr,
+            _KIND_WEIGHT_LUT[kind_arr])
+
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(bits: int) -> int:
+        return bin(bits).count("1")
+
+
+def _sid_bitset(sid_ids: Iterable[int]) -> int:
+    """Set of (non-negative) sid ids as an int bitmask: bit k <=> sid id k."""
+    bits = 0
+    for sid_id in sid_ids:
+        if sid_id >= 0:
+            bits |= 1 << sid_id
+    return bits
+
+
+def _pair_counts(keys: List[int]) -> Dict[int, int]:
+    """Multiset of known (sid, val) pairs, by packed key (see _pack_keys)."""
+    counts: Dict[int, int] = {}
+    for key in keys:
+        if key >= 0:
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def _bitset_words(bits: int, n_words: int) -> Any:
+    """Int bitmask -> uint64[n_words] (little-endian word order)."""
+    return np.frombuffer(bits.to_bytes(n_words * 8, "little"), dtype="<u8")
+
+
+if np is not None and hasattr(np, "bitwise_count"):
+    def _popcount_rows(words: Any) -> Any:
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+elif np is not None:
+    def _popcount_rows(words: Any) -> Any:
+        # numpy < 2.0: no bitwise_count, count bits of the byte view instead
+        return np.unpackbits(words.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
 
 
 # -----------------------
@@ -63,27 +143,111 @@ def _kind_weight(kind: Optional[str]) -> float:
 # -----------------------
 
 class StaticChain:
+    """One static chain stored as a struct of arrays (one entry per position)."""
     __slots__ = (
         "chain_id",
         "source",
         "seq_hash_val",  # List[Tuple[str, bool]]
-        "seq_sid_val",   # List[Tuple[str, bool]]
-        "sid_set",       # Set[str]
-        "kind_seq",      # List[str]
+        "keys",          # int64[:] sid_id << 1 | value, sid ids interned per func_hash
+        "kind_ids",      # int8[:] kind id, see _KIND_IDS
+        "kind_w",        # float32[:] kind weight
+        "sid_bitset",    # int bitmask over sid ids
+        "sid_count",     # number of distinct sids (popcount of sid_bitset)
+        "pair_counts",   # (sid, val) multiset, see _pair_counts
         "weight_sum",
     )
 
     def __init__(self, chain_id: int, source: str,
                  seq_hash_val: List[Tuple[str, bool]],
-                 seq_sid_val: List[Tuple[str, bool]],
-                 kind_seq: List[str]):
+                 sid_ids: List[int],
+                 vals: List[bool],
+                 kind_ids: List[int]):
         self.chain_id = chain_id
         self.source = source
         self.seq_hash_val = seq_hash_val
-        self.seq_sid_val = seq_sid_val
-        self.sid_set = {sid for sid, _ in seq_sid_val}
-        self.kind_seq = kind_seq
-        self.weight_sum = sum(_kind_weight(k) for k in kind_seq)
+        keys = _pack_keys(sid_ids, vals)
+        self.keys, self.kind_ids, self.kind_w = _as_arrays(keys, kind_ids)
+        self.sid_bitset = _sid_bitset(sid_ids)
+        self.sid_count = _popcount(self.sid_bitset)
+        self.pair_counts = _pair_counts(keys)
+        self.weight_sum = float(sum(self.kind_w))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class _RuntimeSeq:
+    """Runtime condition sequence in the same SoA layout as StaticChain."""
+    __slots__ = ("keys", "kind_ids", "kind_w", "sid_bitset", "sid_count",
+                 "pair_counts", "pair_w", "weight_sum")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def _prepare_runtime(runtime_conds: List[JsonObj], sid_intern: Dict[str, int]) -> _RuntimeSeq:
+    """Encode runtime cond events once per match against a function's sid ids.
+
+    Sids unknown to the function get distinct negative ids: they never align
+    as equal and set no bit, but still count toward sid_count (the union size).
+    """
+    unknown: Dict[str, int] = {}
+    sid_ids: List[int] = []
+    vals: List[bool] = []
+    kind_ids: List[int] = []
+    for ev in runtime_conds:
+        kind = ev.get("cond_kind")
+        sid = _sid(kind, ev.get("cond_norm"))
+        sid_id = sid_intern.get(sid)
+        if sid_id is None:
+            sid_id = unknown.setdefault(sid, -1 - len(unknown))
+        sid_ids.append(sid_id)
+        vals.append(_val_eff(ev))
+        kind_ids.append(_kind_id(str(kind or "")))
+    run = _RuntimeSeq()
+    run.sid_bitset = _sid_bitset(sid_ids)
+    run.sid_count = _popcount(run.sid_bitset) + len(unknown)
+    keys = _pack_keys(sid_ids, vals)
+    run.pair_counts = _pair_counts(keys)
+    # a sid fixes its kind, so each (sid, val) pair has a single weight
+    run.pair_w = {key: _KIND_WEIGHTS[k] for key, k in zip(keys, kind_ids) if key >= 0}
+    run.keys, run.kind_ids, run.kind_w = _as_arrays(keys, kind_ids)
+    run.weight_sum = float(sum(run.kind_w))
+    return run
+
+
+def _combine_score(raw: float, lcp: int, lcs: int, run: _RuntimeSeq, ch: StaticChain) -> float:
+    """Final similarity in [0,1] from the alignment score and LCP/LCS."""
+    # Normalize score in [0,1] using an optimistic upper bound
+    max_possible = max(1e-6, 2.0 * min(run.weight_sum, ch.weight_sum))
+    norm = max(0.0, min(1.0, raw / max_possible))
+    lmin = max(1, min(len(run), len(ch)))
+    lcp_ratio = lcp / lmin
+    lcs_ratio = lcs / lmin
+    return 0.7 * norm + 0.2 * lcp_ratio + 0.1 * lcs_ratio
+
+
+def _score_upper_bound(run: _RuntimeSeq, ch: StaticChain) -> float:
+    """Admissible bound on _combine_score for this pair, without the DP.
+
+    Only keep steps (equal sid and val) score positively, at 2 * their kind
+    weight, and an alignment keeps each (sid, val) pair at most as often as
+    it occurs in both sequences. So with I the multiset intersection of
+    (sid, val) pairs and WI its weighted size: raw <= 2 * WI and
+    lcp <= lcs <= I. _combine_score is monotone in all three.
+    """
+    st_counts = ch.pair_counts
+    inter = 0
+    winter = 0.0
+    for key, cnt in run.pair_counts.items():
+        c = st_counts.get(key)
+        if c:
+            c = min(c, cnt)
+            inter += c
+            winter += c * run.pair_w[key]
+    lmin = max(1, min(len(run), len(ch)))
+    inter = min(inter, lmin)
+    return _combine_score(2.0 * winter, inter, inter, run, ch)
 
 
 class StaticIndex:
@@ -92,6 +256,16 @@ class StaticIndex:
         self.by_func: Dict[str, List[StaticChain]] = {}
         # cond_hash -> (cond_norm, cond_kind)
         self.cond_info_by_hash: Dict[str, Tuple[str, str]] = {}
+        # func_hash -> (sid -> dense id). Matching never crosses functions, so
+        # ids are per function, which keeps the sid bitsets narrow.
+        self._sid_intern: Dict[str, Dict[str, int]] = {}
+        # func_hash -> uint64[n_chains, K] sid bitsets (row i <=> by_func[fh][i])
+        # and uint32[n_chains] popcounts; only built when numpy is available.
+        self.sid_bitsets: Dict[str, Any] = {}
+        self.chain_popcnt: Dict[str, Any] = {}
+        # func_hash -> (key_flat, w_flat, offsets): all chains of the
+        # function packed CSR-style for the batch kernel; only built with numba.
+        self.flat: Dict[str, Tuple[Any, Any, Any]] = {}
 
     @staticmethod
     def from_meta(meta: JsonObj) -> "StaticIndex":
@@ -113,6 +287,7 @@ class StaticIndex:
             out: List[StaticChain] = []
             if not isinstance(chains, list):
                 continue
+            sid_intern: Dict[str, int] = {}
             chain_id = 0
             for entry in chains:
                 try:
@@ -122,8 +297,9 @@ class StaticIndex:
                 # seq_hash_val should be a list of (cond_hash, value)
                 if not isinstance(seq_hash_val, list):
                     continue
-                sid_val: List[Tuple[str, bool]] = []
-                kinds: List[str] = []
+                sid_ids: List[int] = []
+                vals: List[bool] = []
+                kind_ids: List[int] = []
                 ok = True
                 for t in seq_hash_val:
                     if not isinstance(t, (list, tuple)) or len(t) != 2:
@@ -137,127 +313,261 @@ class StaticIndex:
                         ok = False
                         break
                     cn, ck = cond
-                    sid_val.append((_sid(ck, cn), bool(v)))
-                    kinds.append(ck)
+                    sid_ids.append(sid_intern.setdefault(_sid(ck, cn), len(sid_intern)))
+                    vals.append(bool(v))
+                    kind_ids.append(_kind_id(ck))
                 if not ok:
                     chain_id += 1
                     continue
-                out.append(StaticChain(chain_id, str(source), seq_hash_val, sid_val, kinds))
+                out.append(StaticChain(chain_id, str(source), seq_hash_val, sid_ids, vals, kind_ids))
                 chain_id += 1
             if out:
                 idx.by_func[str(fh)] = out
+                idx._sid_intern[str(fh)] = sid_intern
+                if np is not None:
+                    n_words = max(1, (len(sid_intern) + 63) // 64)
+                    idx.sid_bitsets[str(fh)] = np.stack(
+                        [_bitset_words(ch.sid_bitset, n_words) for ch in out])
+                    idx.chain_popcnt[str(fh)] = np.array(
+                        [ch.sid_count for ch in out], dtype=np.uint32)
+                if njit is not None:
+                    idx._pack_flat(str(fh), out)
         return idx
 
-
-# -----------------------
-# Sequence metrics
-# -----------------------
-
-def lcp_len(a: List[Tuple[str, bool]], b: List[Tuple[str, bool]]) -> int:
-    n = min(len(a), len(b))
-    i = 0
-    while i < n and a[i] == b[i]:
-        i += 1
-    return i
-
-
-def lcs_len(a: List[Tuple[str, bool]], b: List[Tuple[str, bool]]) -> int:
-    n, m = len(a), len(b)
-    dp = [[0] * (m + 1) for _ in range(n + 1)]
-    for i in range(n - 1, -1, -1):
-        for j in range(m - 1, -1, -1):
-            if a[i] == b[j]:
-                dp[i][j] = 1 + dp[i + 1][j + 1]
-            else:
-                dp[i][j] = max(dp[i + 1][j], dp[i][j + 1])
-    return dp[0][0]
+    def _pack_flat(self, func_hash: str, chains: List[StaticChain]) -> None:
+        offsets = np.zeros(len(chains) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(ch) for ch in chains])
+        key_flat = np.concatenate([ch.keys for ch in chains])
+        w_flat = np.concatenate([ch.kind_w for ch in chains])
+        # Re-point each chain at its slice so the data is stored once
+        for r, ch in enumerate(chains):
+            a, b = offsets[r], offsets[r + 1]
+            ch.keys, ch.kind_w = key_flat[a:b], w_flat[a:b]
+        self.flat[func_hash] = (key_flat, w_flat, offsets)
 
 
 # -----------------------
 # Alignment and diff
 # -----------------------
 
-def align_with_diffs(
-    run_sid_val: List[Tuple[str, bool]],
-    run_kinds: List[str],
-    st_sid_val: List[Tuple[str, bool]],
-    st_kinds: List[str],
-) -> Tuple[float, List[Dict[str, Any]]]:
-    """Needleman-Wunsch-like alignment over (sid, val) with weighted scoring.
-
-    Returns (raw_score, diffs)
-    diffs: list of steps, each with op in {keep, flip, subst, ins, del} and payload.
+# Traceback codes stored per DP cell. Border cells (i == 0 or j == 0) are
+# left at 0: their move is implied (i == 0 -> ins, j == 0 -> del).
+_TB_BORDER = 0
+_TB_MATCH = 1
+_TB_DEL = 2
+_TB_INS = 3
+
+
+def _align_fill(run_keys, run_w, st_keys, st_w, score_rows, lcs_rows, tb):
+    """Fill the alignment DP; return (score, lcp, lcs).
+
+    One sweep computes the weighted alignment score, the LCS of equal
+    (sid, val) pairs and, up front, the LCP. Scores and LCS lengths are kept
+    in two rolling rows each (score_rows/lcs_rows, shape 2 x (m+1)); the
+    zero-initialised traceback tb[n+1][m+1] receives one of _TB_MATCH/_TB_DEL/
+    _TB_INS per interior cell; border cells are not written. A tb of a single
+    row is scratch for callers that only need the scores: every DP row is
+    written to it and no traceback is kept.
+    Written against plain indexing so the same body runs as the Numba kernel
+    (numpy buffers) and as the pure-Python fallback (lists/bytearrays).
     """
-    n, m = len(run_sid_val), len(st_sid_val)
-    # DP matrices
-    score = [[0.0] * (m + 1) for _ in range(n + 1)]
-    prev = [[None] * (m + 1) for _ in range(n + 1)]  # stores (i', j', op)
-
-    def gap_penalty_run(i: int) -> float:
-        # delete run[i-1]
-        return -0.75 * _kind_weight(run_kinds[i - 1])
-
-    def gap_penalty_st(j: int) -> float:
-        # insert st[j-1]
-        return -0.75 * _kind_weight(st_kinds[j - 1])
-
+    n = len(run_keys)
+    m = len(st_keys)
+    # longest common prefix of (sid, val) pairs
+    lcp = 0
+    while lcp < n and lcp < m and run_keys[lcp] == st_keys[lcp]:
+        lcp += 1
+    keep_tb = len(tb) > 1
     # init borders
-    for i in range(1, n + 1):
-        score[i][0] = score[i - 1][0] + gap_penalty_run(i)
-        prev[i][0] = (i - 1, 0, "del")
+    prev = score_rows[0]
+    lcs_prev = lcs_rows[0]
+    prev[0] = 0.0
+    lcs_prev[0] = 0
     for j in range(1, m + 1):
-        score[0][j] = score[0][j - 1] + gap_penalty_st(j)
-        prev[0][j] = (0, j - 1, "ins")
-
+        # insert st[j-1]
+        prev[j] = prev[j - 1] - 0.75 * st_w[j - 1]
+        lcs_prev[j] = 0
     # fill
     for i in range(1, n + 1):
-        sid_i, v_i = run_sid_val[i - 1]
+        prev = score_rows[(i - 1) & 1]
+        cur = score_rows[i & 1]
+        lcs_prev = lcs_rows[(i - 1) & 1]
+        lcs_cur = lcs_rows[i & 1]
+        key_i = run_keys[i - 1]
+        sid_i = key_i >> 1
+        w_i = run_w[i - 1]
+        # delete run[i-1]
+        gap_run = -0.75 * w_i
+        row = tb[i] if keep_tb else tb[0]
+        cur[0] = prev[0] + gap_run
+        lcs_cur[0] = 0
         for j in range(1, m + 1):
-            sid_j, v_j = st_sid_val[j - 1]
-            w = 0.5 * (_kind_weight(run_kinds[i - 1]) + _kind_weight(st_kinds[j - 1]))
-            if sid_i == sid_j:
-                s = 2.0 * w if v_i == v_j else -0.5 * w  # keep vs flip
+            w = 0.5 * (w_i + st_w[j - 1])
+            key_j = st_keys[j - 1]
+            if key_i == key_j:
+                s = 2.0 * w  # keep
+                lcs_cur[j] = lcs_prev[j - 1] + 1
             else:
-                s = -1.0 * w  # substitution
+                s = -0.5 * w if sid_i == key_j >> 1 else -1.0 * w  # flip vs substitution
+                lcs_cur[j] = max(lcs_prev[j], lcs_cur[j - 1])
             # candidates
-            c_match = score[i - 1][j - 1] + s
-            c_del = score[i - 1][j] + gap_penalty_run(i)
-            c_ins = score[i][j - 1] + gap_penalty_st(j)
+            c_match = prev[j - 1] + s
+            c_del = prev[j] + gap_run
+            c_ins = cur[j - 1] - 0.75 * st_w[j - 1]
             # choose
             if c_match >= c_del and c_match >= c_ins:
-                score[i][j] = c_match
-                prev[i][j] = (i - 1, j - 1, "match")
+                cur[j] = c_match
+                row[j] = _TB_MATCH
             elif c_del >= c_ins:
-                score[i][j] = c_del
-                prev[i][j] = (i - 1, j, "del")
+                cur[j] = c_del
+                row[j] = _TB_DEL
             else:
-                score[i][j] = c_ins
-                prev[i][j] = (i, j - 1, "ins")
+                cur[j] = c_ins
+                row[j] = _TB_INS
+    return score_rows[n & 1][m], lcp, lcs_rows[n & 1][m]
+
+
+# _align_fill compiled by _align_kernel(); False once unavailable
+_align_nb: Any = None
+
+
+def _align_kernel() -> Any:
+    """The compiled alignment kernel, built on first use; False without it.
 
-    # backtrack diffs
+    Not cached on disk: numba's cache records the module name, which differs
+    between script and package runs and then fails to load. If numba is
+    missing or compilation fails, _align_fill runs as pure Python.
+    """
+    global _align_nb
+    if _align_nb is None:
+        _align_nb = False
+        if njit is not None:
+            try:
+                kernel = njit(_align_fill)
+                warm = _as_arrays([1], [0])
+                kernel(warm[0], warm[2], warm[0], warm[2], np.empty((2, 2), dtype=np.float32),
+                       np.empty((2, 2), dtype=np.int32), np.zeros((2, 2), dtype=np.int8))
+                _align_nb = kernel
+            except Exception as exc:
+                logger.warning("alignment kernel unavailable, aligning in pure Python: %s", exc)
+    return _align_nb
+
+
+def _align(run_keys, run_w, st_keys, st_w) -> Tuple[float, int, int, Any]:
+    n, m = len(run_keys), len(st_keys)
+    kernel = _align_kernel()
+    if kernel:
+        tb = np.zeros((n + 1, m + 1), dtype=np.int8)
+        score_rows = np.empty((2, m + 1), dtype=np.float32)
+        lcs_rows = np.empty((2, m + 1), dtype=np.int32)
+        raw, lcp, lcs = kernel(run_keys, run_w, st_keys, st_w, score_rows, lcs_rows, tb)
+        return float(raw), int(lcp), int(lcs), tb
+    tb = [bytearray(m + 1) for _ in range(n + 1)]
+    raw, lcp, lcs = _align_fill(run_keys, run_w, st_keys, st_w,
+                                [[0.0] * (m + 1) for _ in range(2)],
+                                [[0] * (m + 1) for _ in range(2)], tb)
+    return float(raw), int(lcp), int(lcs), tb
+
+
+def align_with_diffs(
+    run_keys, run_w,
+    st_keys, st_w,
+) -> Tuple[float, int, int, List[Dict[str, Any]]]:
+    """Needleman-Wunsch-like alignment over (sid, val) with weighted scoring.
+
+    Sequences are given as parallel (packed key, kind weight) arrays, see
+    _pack_keys.
+    Returns (raw_score, lcp, lcs, diffs); lcp/lcs count equal (sid, val) pairs.
+    diffs: list of steps, each with op in {keep, flip, subst, ins, del} and payload.
+    """
+    raw, lcp, lcs, tb = _align(run_keys, run_w, st_keys, st_w)
+    return raw, lcp, lcs, _backtrack(run_keys, st_keys, tb)
+
+
+def _backtrack(run_keys, st_keys, tb) -> List[Dict[str, Any]]:
+    """Walk the traceback from (n, m) back to the origin and emit diff steps."""
     diffs: List[Dict[str, Any]] = []
-    i, j = n, m
+    i, j = len(run_keys), len(st_keys)
     while i > 0 or j > 0:
-        pi = prev[i][j]
-        if pi is None:
-            break
-        ni, nj, op = pi
-        if op == "match":
-            sid_i, v_i = run_sid_val[i - 1]
-            sid_j, v_j = st_sid_val[j - 1]
-            if sid_i == sid_j and v_i == v_j:
+        if i == 0:
+            op = _TB_INS
+        elif j == 0:
+            op = _TB_DEL
+        else:
+            op = tb[i][j]
+        if op == _TB_MATCH:
+            if run_keys[i - 1] == st_keys[j - 1]:
                 diffs.append({"op": "keep", "run_idx": i - 1, "st_idx": j - 1})
-            elif sid_i == sid_j:
+            elif run_keys[i - 1] >> 1 == st_keys[j - 1] >> 1:
                 diffs.append({"op": "flip", "run_idx": i - 1, "st_idx": j - 1})
             else:
                 diffs.append({"op": "subst", "run_idx": i - 1, "st_idx": j - 1})
-        elif op == "del":
+            i -= 1
+            j -= 1
+        elif op == _TB_DEL:
             diffs.append({"op": "del", "run_idx": i - 1})
+            i -= 1
         else:
             diffs.append({"op": "ins", "st_idx": j - 1})
-        i, j = ni, nj
+            j -= 1
     diffs.reverse()
-    return score[n][m], diffs
+    return diffs
+
+
+if njit is not None:
+    from numba import prange
+
+
+def _align_batch(run_keys, run_w, key_flat, w_flat, offsets, rows):
+    """Score run against chains rows[k] of a CSR-packed function in parallel.
+
+    Chain r occupies [offsets[r], offsets[r+1]) of the *_flat arrays.
+    Returns (raw scores, lcps, lcss); no tracebacks are built.
+    """
+    k = rows.shape[0]
+    scores = np.empty(k, dtype=np.float64)
+    lcps = np.empty(k, dtype=np.int64)
+    lcss = np.empty(k, dtype=np.int64)
+    for c in prange(k):
+        a = offsets[rows[c]]
+        b = offsets[rows[c] + 1]
+        score_rows = np.empty((2, b - a + 1), dtype=np.float32)
+        lcs_rows = np.empty((2, b - a + 1), dtype=np.int32)
+        # scores only: a one-row scratch traceback (see _align_fill)
+        tb = np.empty((1, b - a + 1), dtype=np.int8)
+        raw, lcp, lcs = _align_nb(run_keys, run_w, key_flat[a:b], w_flat[a:b],
+                                  score_rows, lcs_rows, tb)
+        scores[c] = raw
+        lcps[c] = lcp
+        lcss[c] = lcs
+    return scores, lcps, lcss
+
+
+# _align_batch compiled by _batch_kernel(); False once unavailable
+_align_batch_nb: Any = None
+
+
+def _batch_kernel() -> Any:
+    """The parallel batch kernel, compiled on first use; False without it.
+
+    Not cached on disk, like _align_kernel. If numba is missing or
+    compilation fails, candidates are aligned one by one.
+    """
+    global _align_batch_nb
+    if _align_batch_nb is None:
+        _align_batch_nb = False
+        # _align_batch calls _align_nb, which must be compiled first
+        if _align_kernel():
+            try:
+                kernel = njit(parallel=True)(_align_batch)
+                warm = _as_arrays([1], [0])
+                kernel(warm[0], warm[2], warm[0], warm[2],
+                       np.array([0, 1], dtype=np.int64), np.array([0], dtype=np.int64))
+                _align_batch_nb = kernel
+            except Exception as exc:
+                logger.warning("parallel alignment kernel unavailable, aligning candidates "
+                               "one by one: %s", exc)
+    return _align_batch_nb
 
 
 # -----------------------
@@ -267,20 +577,119 @@ def align_with_diffs(
 class ApproxMatcher:
     def __init__(self, index: StaticIndex):
         self.index = index
+        # DP scratch reused across alignments, grown on demand (see _align):
+        # two rolling score/LCS rows, and with numba a flat traceback buffer
+        self._rows_cap = 0
+        self._score_rows: Any = None
+        self._lcs_rows: Any = None
+        self._tb_buf: Any = None
+
+    def _align(self, run_keys, run_w, st_keys, st_w) -> Tuple[float, int, int, Any]:
+        """Like the module-level _align, but on this matcher's scratch buffers.
+
+        With numba the returned traceback is a view into a shared buffer and
+        only valid until the next call; without it a fresh table is returned.
+        """
+        n, m = len(run_keys), len(st_keys)
+        kernel = _align_kernel()
+        if self._rows_cap < m + 1:
+            cap = max(m + 1, 2 * self._rows_cap, 64)
+            if kernel:
+                self._score_rows = np.empty(2 * cap, dtype=np.float32)
+                self._lcs_rows = np.empty(2 * cap, dtype=np.int32)
+            else:
+                # _align_fill only touches the first m+1 entries of each row
+                self._score_rows = [[0.0] * cap for _ in range(2)]
+                self._lcs_rows = [[0] * cap for _ in range(2)]
+            self._rows_cap = cap
+        if not kernel:
+            tb = [bytearray(m + 1) for _ in range(n + 1)]
+            raw, lcp, lcs = _align_fill(run_keys, run_w, st_keys, st_w,
+                                        self._score_rows, self._lcs_rows, tb)
+            return float(raw), int(lcp), int(lcs), tb
+        size = (n + 1) * (m + 1)
+        tb_cap = 0 if self._tb_buf is None else len(self._tb_buf)
+        if tb_cap < size:
+            self._tb_buf = np.empty(max(size, 2 * tb_cap), dtype=np.int8)
+        tb = self._tb_buf[:size].reshape(n + 1, m + 1)
+        tb[0] = 0
+        tb[:, 0] = 0
+        raw, lcp, lcs = kernel(run_keys, run_w, st_keys, st_w,
+                               self._score_rows[:2 * (m + 1)].reshape(2, m + 1),
+                               self._lcs_rows[:2 * (m + 1)].reshape(2, m + 1), tb)
+        return float(raw), int(lcp), int(lcs), tb
 
     @staticmethod
     def from_meta(meta: JsonObj) -> "ApproxMatcher":
         return ApproxMatcher(StaticIndex.from_meta(meta))
 
-    def _prefilter(self, sid_set_run: Set[str], cand: Iterable[StaticChain], top_m: int = 20) -> List[StaticChain]:
-        scored: List[Tuple[float, StaticChain]] = []
-        for ch in cand:
-            inter = len(sid_set_run & ch.sid_set)
-            union = len(sid_set_run | ch.sid_set) or 1
-            jacc = inter / union
-            scored.append((jacc, ch))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [c for _, c in scored[:top_m]]
+    def _prefilter(self, func_hash: str, run_bits: int, run_count: int,
+                   top_m: int = 20) -> List[int]:
+        """Rows (into by_func[func_hash]) of the top_m chains by sid-set Jaccard.
+
+        run_count counts all distinct runtime sids, including those unknown to
+        the index (which have no bit in run_bits but still enlarge the union).
+        Ties keep index order, as a stable sort would.
+        """
+        chains = self.index.by_func[func_hash]
+        if top_m <= 0:
+            return []
+        if np is None:
+            scored: List[Tuple[float, int]] = []
+            for r, ch in enumerate(chains):
+                inter = _popcount(run_bits & ch.sid_bitset)
+                union = (run_count + ch.sid_count - inter) or 1
+                scored.append((inter / union, r))
+            scored.sort(key=lambda x: x[0], reverse=True)
+            return [r for _, r in scored[:top_m]]
+
+        words = self.index.sid_bitsets[func_hash]
+        inter = _popcount_rows(words & _bitset_words(run_bits, words.shape[1]))
+        union = run_count + self.index.chain_popcnt[func_hash].astype(np.int64) - inter
+        union[union == 0] = 1
+        jacc = inter / union
+        n = len(jacc)
+        if n > top_m:
+            # Top-M selection in O(n): everything above the M-th largest value,
+            # then the lowest-index chains among those tied with it
+            kth = np.partition(jacc, n - top_m)[n - top_m]
+            above = np.flatnonzero(jacc > kth)
+            ties = np.flatnonzero(jacc == kth)[:top_m - len(above)]
+            sel = np.sort(np.concatenate((above, ties)))
+        else:
+            sel = np.arange(n)
+        return sel[np.argsort(-jacc[sel], kind="stable")].tolist()
+
+    def _score_batch(self, func_hash: str, run_keys, run_w,
+                     rows: List[int]) -> Tuple[List[float], List[int], List[int], Optional[List[Any]]]:
+        """Align the runtime sequence against chains `rows` of func_hash.
+
+        Returns (raw scores, lcps, lcss, tracebacks). With the batch kernel all
+        rows are scored in one parallel call, otherwise one by one; tracebacks
+        are kept only on the pure-Python path and are None otherwise (callers
+        re-align the few rows they need diffs for).
+        """
+        batch = _batch_kernel()
+        if batch:
+            key_flat, w_flat, offsets = self.index.flat[func_hash]
+            scores, lcps, lcss = batch(run_keys, run_w, key_flat, w_flat, offsets,
+                                       np.asarray(rows, dtype=np.int64))
+            return scores.tolist(), lcps.tolist(), lcss.tolist(), None
+        chains = self.index.by_func[func_hash]
+        raws: List[float] = []
+        lcps: List[int] = []
+        lcss: List[int] = []
+        tbs: List[Any] = []
+        for r in rows:
+            ch = chains[r]
+            raw, lcp, lcs, tb = self._align(run_keys, run_w, ch.keys, ch.kind_w)
+            raws.append(raw)
+            lcps.append(lcp)
+            lcss.append(lcs)
+            tbs.append(tb)
+        # With numba each traceback is a view into the shared buffer, so only
+        # the last one would still be valid; callers re-align instead
+        return raws, lcps, lcss, None if _align_kernel() else tbs
 
     def match(
         self,
@@ -290,53 +699,77 @@ class ApproxMatcher:
         threshold: float = 0.6,
         prefilter_size: int = 20,
     ) -> List[JsonObj]:
-        # Prepare runtime sid/val and kinds
-        run_sid_val: List[Tuple[str, bool]] = []
-        run_kinds: List[str] = []
-        sid_set_run: Set[str] = set()
-        for ev in runtime_conds:
-            sid = _sid(ev.get("cond_kind"), ev.get("cond_norm"))
-            ve = _val_eff(ev)
-            run_sid_val.append((sid, ve))
-            run_kinds.append(str(ev.get("cond_kind") or ""))
-            sid_set_run.add(sid)
-
         # Collect candidates
         # Restrict to same func_hash only; no global fallback
         if not func_hash or func_hash not in self.index.by_func:
             return []
-        cands: List[StaticChain] = list(self.index.by_func[func_hash])
-        if not cands:
+        if not self.index.by_func[func_hash]:
             return []
 
-        # Prefilter
-        cands = self._prefilter(sid_set_run, cands, top_m=prefilter_size)
-        if not cands:
+        run = _prepare_runtime(runtime_conds, self.index._sid_intern[func_hash])
+        return self._match_prepared(func_hash, run, topk, threshold, prefilter_size)
+
+    def match_batch(
+        self,
+        func_hash: Optional[str],
+        runtime_seqs: List[List[JsonObj]],
+        topk: int = 3,
+        threshold: float = 0.6,
+        prefilter_size: int = 20,
+    ) -> List[List[JsonObj]]:
+        """match() for several runtime sequences of one function, results in order.
+
+        Sequences encoding to the same (sid, val) keys are matched once and
+        share the result list.
+        """
+        if not func_hash or not self.index.by_func.get(func_hash):
+            return [[] for _ in runtime_seqs]
+        sid_intern = self.index._sid_intern[func_hash]
+        done: Dict[Tuple[Any, Any], List[JsonObj]] = {}
+        out: List[List[JsonObj]] = []
+        for runtime_conds in runtime_seqs:
+            run = _prepare_runtime(runtime_conds, sid_intern)
+            # Unknown sids are numbered by first occurrence, so equal keys mean
+            # the same sequence up to their naming; kinds weigh those sids
+            if np is not None:
+                key = (run.keys.tobytes(), run.kind_ids.tobytes())
+            else:
+                key = (tuple(run.keys), bytes(run.kind_ids))
+            res = done.get(key)
+            if res is None:
+                res = done[key] = self._match_prepared(func_hash, run, topk, threshold, prefilter_size)
+            out.append(res)
+        return out
+
+    def _match_prepared(self, func_hash: str, run: _RuntimeSeq, topk: int, threshold: float,
+                        prefilter_size: int) -> List[JsonObj]:
+        # Prefilter, then drop candidates that cannot reach the threshold
+        chains = self.index.by_func[func_hash]
+        rows = self._prefilter(func_hash, run.sid_bitset, run.sid_count, top_m=prefilter_size)
+        rows = [r for r in rows if _score_upper_bound(run, chains[r]) >= threshold]
+        if not rows:
             return []
 
-        # Score with alignment
-        scored: List[Tuple[float, JsonObj]] = []
-        # Precompute run weight sum upper bound
-        max_w = sum(_kind_weight(k) for k in run_kinds)
-        for ch in cands:
-            raw, diffs = align_with_diffs(run_sid_val, run_kinds, ch.seq_sid_val, ch.kind_seq)
-            # Normalize score in [0,1] using an optimistic upper bound
-            max_possible = max(1e-6, 2.0 * min(max_w, ch.weight_sum))
-            norm = max(0.0, min(1.0, raw / max_possible))
-            lcp = lcp_len(run_sid_val, ch.seq_sid_val)
-            lcs = lcs_len(run_sid_val, ch.seq_sid_val)
-            lmin = max(1, min(len(run_sid_val), len(ch.seq_sid_val)))
-            lcp_ratio = lcp / lmin
-            lcs_ratio = lcs / lmin
-            score = 0.7 * norm + 0.2 * lcp_ratio + 0.1 * lcs_ratio
+        # Score all candidates, then build diffs only for the Top-K survivors
+        raws, lcps, lcss, tbs = self._score_batch(func_hash, run.keys, run.kind_w, rows)
+        scored: List[Tuple[float, int]] = []
+        for k, r in enumerate(rows):
+            score = _combine_score(raws[k], lcps[k], lcss[k], run, chains[r])
             if score >= threshold:
-                scored.append((score, {
-                    "source": ch.source,
-                    "chain_id": ch.chain_id,
-                    "score": round(score, 4),
-                    "lcp": lcp,
-                    "lcs": lcs,
-                    "diffs": diffs,
-                }))
+                scored.append((score, k))
         scored.sort(key=lambda x: x[0], reverse=True)
-        return [item for _, item in scored[:topk]]
+
+        out: List[JsonObj] = []
+        for score, k in scored[:topk]:
+            ch = chains[rows[k]]
+            tb = tbs[k] if tbs is not None else \
+                self._align(run.keys, run.kind_w, ch.keys, ch.kind_w)[3]
+            out.append({
+                "source": ch.source,
+                "chain_id": ch.chain_id,
+                "score": round(score, 4),
+                "lcp": lcps[k],
+                "lcs": lcss[k],
+                "diffs": _backtrack(run.keys, ch.keys, tb),
+            })
+        return out
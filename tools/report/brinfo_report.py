@@ -1,26 +1,34 @@
 #!/usr/bin/env python3
 import argparse
-import json
+import heapq
+import itertools
+import logging
+import multiprocessing
+import operator
 import sys
 import os
-from typing import Dict, Any, List, Optional, TextIO
+import queue
+import re
+import tempfile
+import zlib
+from typing import Dict, Any, Iterable, Iterator, List, Optional, BinaryIO, Tuple, Union
 
 # Prefer package-relative imports; fall back to absolute when executed as a script
 try:
-    from .runtime_utils import open_maybe_gz, TestState, should_keep_test as _skt_impl
+    from .runtime_utils import open_maybe_gz, json_loads, TestState, CallColumns, should_keep_test as _skt_impl, build_test_filter
     from .meta_loader import load_meta as _load_meta_impl
-    from .emitter import emit_triple as _emit_impl
+    from .emitter import emit_triple as _emit_impl, test_record_head, CondList
+    from .cond_utils import CondColumns
 except Exception:
-    from runtime_utils import open_maybe_gz, TestState, should_keep_test as _skt_impl  # type: ignore
+    from runtime_utils import open_maybe_gz, json_loads, TestState, CallColumns, should_keep_test as _skt_impl, build_test_filter  # type: ignore
     from meta_loader import load_meta as _load_meta_impl  # type: ignore
-    from emitter import emit_triple as _emit_impl  # type: ignore
+    from emitter import emit_triple as _emit_impl, test_record_head, CondList  # type: ignore
+    from cond_utils import CondColumns  # type: ignore
 
+logger = logging.getLogger("brinfo_report")
 
-def open_maybe_gz(path: str) -> TextIO:
-    """Open a text file that may be gzip-compressed (by .gz suffix)."""
-    if path.endswith('.gz'):
-        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8')
-    return open(path, 'r', encoding='utf-8')
+# Output buffer; records are small, so they are coalesced into large writes
+WRITE_BUFFER_SIZE = 1 << 20
 
 
 def parse_args() -> argparse.Namespace:
@@ -31,6 +39,8 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument('--suite', default=None, help='Filter suite regex (substring match)')
     ap.add_argument('--test', dest='test_name', default=None, help='Filter test name regex (substring match)')
     ap.add_argument('--dedupe-conds', action='store_true', help='Deduplicate condition chain by cond_hash')
+    ap.add_argument('--no-cond-chains', dest='emit_chains', action='store_false',
+                    help='Leave cond_chains empty in the output (matching is unaffected)')
     # Approximate matching options
     ap.add_argument('--approx-match', action='store_true', default=False,
                     help='When exact static-chain matching is empty, compute approximate matches')
@@ -38,6 +48,10 @@ def parse_args() -> argparse.Namespace:
                     help='Top-K approximate static matches to output (default: 3)')
     ap.add_argument('--approx-threshold', type=float, default=0.6,
                     help='Minimum score threshold [0..1] for approximate matches (default: 0.6)')
+    ap.add_argument('--jobs', type=int, default=1,
+                    help='Worker processes, each handling a shard of the tests (default: 1, in-process; '
+                         '0: one per CPU)')
+    ap.add_argument('--verbose', action='store_true', help='Log debug diagnostics to stderr')
     return ap.parse_args()
 
 
@@ -49,13 +63,16 @@ def should_keep_test(test_info: Optional[JsonObj], suite_filter: Optional[str],
     return _skt_impl(test_info, suite_filter, name_filter)
 
 
-def emit_triple(out_fp: TextIO, test_info: JsonObj, assert_ev: JsonObj,
-                prefix_calls: List[JsonObj], oracle_calls: List[JsonObj],
-                inv_cond: Dict[int, List[JsonObj]], dedupe_conds: bool,
+def emit_triple(out_fp: BinaryIO, test_info: JsonObj, assert_ev: JsonObj,
+                prefix_calls: Union[List[JsonObj], CallColumns], oracle_calls: Union[List[JsonObj], CallColumns],
+                inv_cond: Dict[int, CondList], dedupe_conds: bool,
                 meta: Optional[JsonObj] = None,
-                approx_ctx: Optional[Dict[str, Any]] = None) -> None:
+                approx_ctx: Optional[Dict[str, Any]] = None,
+                emit_chains: bool = True,
+                test_head: Optional[bytes] = None) -> None:
     # Delegate to emitter module (kept wrapper for stable entrypoint and type hints)
-    _emit_impl(out_fp, test_info, assert_ev, prefix_calls, oracle_calls, inv_cond, dedupe_conds, meta, approx_ctx)
+    _emit_impl(out_fp, test_info, assert_ev, prefix_calls, oracle_calls, inv_cond, dedupe_conds, meta, approx_ctx,
+               emit_chains=emit_chains, test_head=test_head)
 
 
 def load_meta(meta_dir: str) -> JsonObj:
@@ -63,14 +80,327 @@ def load_meta(meta_dir: str) -> JsonObj:
     return _load_meta_impl(meta_dir)
 
 
+# Everything an assertion window's record is rendered from, besides the
+# per-run settings: (test_info, assert_ev, prefix_calls, oracle_calls,
+# inv_cond, test_head)
+WindowTask = Tuple[JsonObj, JsonObj, CallColumns, CallColumns, Dict[int, CondColumns], bytes]
+
+
+class _RunContext:
+    """Per-run settings shared by the event handlers."""
+    __slots__ = ('args', 'meta', 'approx_ctx', 'keep_test', 'windows')
+
+    def __init__(self, args: argparse.Namespace, meta: Optional[JsonObj], approx_ctx: Optional[Dict[str, Any]]):
+        self.args = args
+        self.meta = meta
+        self.approx_ctx = approx_ctx
+        # --suite/--test filter, bound once
+        self.keep_test = build_test_filter(args.suite, args.test_name)
+        # Closed assertion windows not yet rendered; see _iter_windows
+        self.windows: List[WindowTask] = []
+
+
+def _emit_open_window(st: TestState, ctx: _RunContext) -> None:
+    """Queue the currently open assertion window of st, if any and not filtered out.
+
+    The call lists and dicts captured here are replaced, never mutated, once
+    the window is closed. The cond columns keep growing while the test runs,
+    but _iter_windows hands out each window, to be rendered, before it
+    handles the next line.
+    """
+    # The --suite/--test decision was taken once at test_start (st.dropped)
+    if st.open_assert and st.test_info and not st.dropped:
+        # Filter conds for calls in this assertion window
+        conds_of = st.conds_of
+        inv_cond = {iid: conds_of(iid) for iid in itertools.chain(st.curr_prefix_iids, st.oracle_iids)}
+        if st.test_head is None:
+            st.test_head = test_record_head(st.test_info)
+        ctx.windows.append((st.test_info, st.open_assert, st.curr_prefix, st.oracle_calls,
+                            inv_cond, st.test_head))
+
+
+def _on_test_start(st: TestState, ev: JsonObj, ctx: _RunContext) -> None:
+    st.test_info = {
+        'suite': ev.get('suite'),
+        'name': ev.get('name'),
+        'full': ev.get('full'),
+        'file': ev.get('file'),
+        'line': ev.get('line'),
+    }
+    st.test_head = None
+    st.buffer_prefix.clear()
+    st.open_assert = None
+    st.curr_prefix = CallColumns()
+    st.oracle_calls = CallColumns()
+    st.clear_conds()
+    st.buffer_prefix_iids.clear()
+    st.curr_prefix_iids = {}
+    st.oracle_iids = {}
+    st.dropped = not ctx.keep_test(st.test_info)
+
+
+def _on_invocation_start(st: TestState, ev: JsonObj, ctx: _RunContext) -> None:
+    # Buffer the event itself; slim_call picks the call fields at emit time
+    iid = ev.get('invocation_id')
+    if st.open_assert and ev.get('in_oracle', 0):
+        st.oracle_calls.append(ev)
+        st.oracle_iids[iid] = None
+        return
+    # Before the first assertion, or outside the oracle: the next prefix.
+    # The prefix is a compressed invocation stream: a repeated start of the
+    # invocation that was just buffered adds no new call, so it is dropped.
+    buf = st.buffer_prefix
+    if buf and buf.invocation_id[-1] == iid:
+        return
+    buf.append(ev)
+    st.buffer_prefix_iids[iid] = None
+
+
+def _on_cond(st: TestState, ev: JsonObj, ctx: _RunContext) -> None:
+    iid = ev.get('invocation_id')
+    if iid is not None:
+        st.add_cond(iid, ev)
+
+
+def _on_assertion(st: TestState, ev: JsonObj, ctx: _RunContext) -> None:
+    # Emit the previous assertion (closing window)
+    _emit_open_window(st, ctx)
+    # Start new assertion window: snapshot current buffer as prefix
+    st.open_assert = ev
+    st.curr_prefix = st.buffer_prefix
+    st.buffer_prefix = CallColumns()
+    st.oracle_calls = CallColumns()
+    st.curr_prefix_iids = st.buffer_prefix_iids
+    st.buffer_prefix_iids = {}
+    st.oracle_iids = {}
+
+
+def _on_test_end(st: TestState, ev: JsonObj, ctx: _RunContext) -> None:
+    # Close any open assertion window on test end
+    _emit_open_window(st, ctx)
+    st.open_assert = None
+    st.curr_prefix = CallColumns()
+    st.buffer_prefix.clear()
+    st.oracle_calls = CallColumns()
+    st.clear_conds()
+    st.buffer_prefix_iids.clear()
+    st.curr_prefix_iids = {}
+    st.oracle_iids = {}
+
+
+# Event type -> handler; events of other types are ignored
+_HANDLERS = {
+    'test_start': _on_test_start,
+    'invocation_start': _on_invocation_start,
+    'cond': _on_cond,
+    'assertion': _on_assertion,
+    'test_end': _on_test_end,
+}
+
+
+# Both routing fields of an event in one C call
+_get_type_and_test = operator.itemgetter('type', 'test_id')
+
+# Position of a window in the output: (0, number of the log line closing it),
+# or (1, number of the line that opened the test) for windows flushed at the
+# end of the log. Single-process output is in this order.
+WindowKey = Tuple[int, int]
+
+
+def _iter_windows(lines: Iterable[Tuple[int, bytes]], ctx: _RunContext) -> Iterator[Tuple[WindowKey, WindowTask]]:
+    """Run the events of numbered log lines, yielding each assertion window as it is closed."""
+    tests: Dict[int, TestState] = {}
+    # test_id -> number of the line its current TestState was created at
+    born: Dict[Any, int] = {}
+    windows = ctx.windows
+    # Per-line lookups bound to locals once
+    loads = json_loads
+    handler_of = _HANDLERS.get
+    state_of = tests.get
+
+    for line_no, line in lines:
+        # Events without a test_id are dropped below anyway; skip such lines
+        # (blank ones included) before paying for a parse. A key spelled
+        # with JSON escapes would be missed, which loggers do not emit.
+        if b'"test_id"' not in line:
+            continue
+        try:
+            ev = loads(line)
+        except Exception:
+            continue
+
+        try:
+            ev_type, test_id = _get_type_and_test(ev)
+        except (KeyError, TypeError):
+            # either field missing (or not a JSON object): not an event of a test
+            continue
+        handler = handler_of(ev_type)
+        if handler is None or test_id is None:
+            continue
+
+        st = state_of(test_id)
+        if st is None:
+            st = tests[test_id] = TestState()
+            born[test_id] = line_no
+        elif st.dropped and handler is not _on_test_start:
+            if handler is _on_test_end:
+                del tests[test_id]
+                del born[test_id]
+            continue
+        handler(st, ev, ctx)
+        if handler is _on_test_end:
+            # A finished test's state is released right away, so tests only
+            # holds the tests still running
+            del tests[test_id]
+            del born[test_id]
+        if windows:
+            for window in windows:
+                yield (0, line_no), window
+            windows.clear()
+
+    # Flush the tests the log left unterminated (no test_end), oldest first
+    for test_id, st in tests.items():
+        _emit_open_window(st, ctx)
+        for window in windows:
+            yield (1, born[test_id]), window
+        windows.clear()
+
+
+def _emit_windows(out_fp: BinaryIO, lines: Iterable[Tuple[int, bytes]], ctx: _RunContext,
+                  with_keys: bool = False) -> None:
+    """Emit the records of lines to out_fp; with_keys prefixes each with its WindowKey."""
+    args = ctx.args
+    for key, window in _iter_windows(lines, ctx):
+        if with_keys:
+            out_fp.write(b'%d%020d ' % key)
+        test_info, assert_ev, prefix_calls, oracle_calls, inv_cond, test_head = window
+        emit_triple(out_fp, test_info, assert_ev, prefix_calls, oracle_calls, inv_cond, args.dedupe_conds,
+                    ctx.meta, ctx.approx_ctx, emit_chains=args.emit_chains, test_head=test_head)
+
+
+# Value of an event's test_id, read without parsing the line: a JSON string
+# or any other scalar. Lines are routed to --jobs shards by it, so a test_id
+# spelled two ways (1 vs 1.0, escapes) would be split across shards.
+_TEST_ID_RE = re.compile(rb'"test_id"\s*:\s*("(?:[^"\\]|\\.)*"|[^\s,}\]]+)')
+# Lines per batch sent to a shard worker, and batches in flight per worker
+_SHARD_BATCH = 2048
+_SHARD_QUEUE = 8
+# Width of the WindowKey prefix of shard lines: b'%d%020d '
+_KEY_PREFIX_LEN = 22
+
+
+def _put_batch(q: "multiprocessing.queues.Queue", batch: Optional[List[Tuple[int, bytes]]],
+               worker: "multiprocessing.process.BaseProcess") -> None:
+    # A worker that died stops draining its queue; fail instead of blocking
+    while True:
+        try:
+            q.put(batch, timeout=1.0)
+            return
+        except queue.Full:
+            if not worker.is_alive():
+                raise RuntimeError('--jobs worker exited early (code %s)' % worker.exitcode)
+
+
+def _shard_worker(line_q: "multiprocessing.queues.Queue", shard_path: str, args: argparse.Namespace,
+                  meta: Optional[JsonObj], approx_ctx: Optional[Dict[str, Any]]) -> None:
+    """--jobs worker: the whole event pipeline over the lines of one shard of tests.
+
+    Lines arrive from line_q in batches, ended by None. Records go to
+    shard_path prefixed with their WindowKey, for _run_sharded's merge.
+    """
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='[%(name)s] %(levelname)s: %(message)s')
+    if approx_ctx is not None:
+        # The batch alignment kernel runs on numba's thread pool; the workers
+        # share the CPUs, so each one gets its share instead of all of them
+        try:
+            import numba
+            share = max(1, (os.cpu_count() or 1) // args.jobs)
+            numba.set_num_threads(min(share, numba.config.NUMBA_NUM_THREADS))
+        except ImportError:
+            pass
+
+    def lines() -> Iterator[Tuple[int, bytes]]:
+        while True:
+            batch = line_q.get()
+            if batch is None:
+                return
+            yield from batch
+
+    with open(shard_path, 'wb', buffering=WRITE_BUFFER_SIZE) as out_fp:
+        _emit_windows(out_fp, lines(), _RunContext(args, meta, approx_ctx), with_keys=True)
+
+
+def _run_sharded(fp: BinaryIO, out_fp: BinaryIO, args: argparse.Namespace,
+                 meta: Optional[JsonObj], approx_ctx: Optional[Dict[str, Any]]) -> None:
+    """Split the tests of the log over args.jobs worker processes.
+
+    This process only routes lines by test_id; each worker parses its lines,
+    runs the per-test state machine and writes a shard. The shards are then
+    merged by WindowKey, so the output equals that of a single process.
+    Workers are spawned, not forked: a fork after numba's thread pool has
+    started (the approximate matcher) leaves the child hung.
+    """
+    mp = multiprocessing.get_context('spawn')
+    n = args.jobs
+    with tempfile.TemporaryDirectory(prefix='brinfo_report.') as tmp:
+        paths = [os.path.join(tmp, 'shard%d.jsonl' % k) for k in range(n)]
+        queues = [mp.Queue(_SHARD_QUEUE) for _ in range(n)]
+        workers = [mp.Process(target=_shard_worker, args=(queues[k], paths[k], args, meta, approx_ctx))
+                   for k in range(n)]
+        for w in workers:
+            w.start()
+        try:
+            batches: List[List[Tuple[int, bytes]]] = [[] for _ in range(n)]
+            search = _TEST_ID_RE.search
+            for line_no, line in enumerate(fp):
+                if b'"test_id"' not in line:
+                    continue
+                m = search(line)
+                k = zlib.crc32(m.group(1)) % n if m is not None else 0
+                batch = batches[k]
+                batch.append((line_no, line))
+                if len(batch) >= _SHARD_BATCH:
+                    _put_batch(queues[k], batch, workers[k])
+                    batches[k] = []
+            for k in range(n):
+                if batches[k]:
+                    _put_batch(queues[k], batches[k], workers[k])
+                _put_batch(queues[k], None, workers[k])
+        except BaseException:
+            for w in workers:
+                w.terminate()
+            raise
+        finally:
+            for w in workers:
+                w.join()
+        failed = [k for k, w in enumerate(workers) if w.exitcode != 0]
+        if failed:
+            raise RuntimeError('--jobs worker(s) %s failed' % failed)
+
+        shards = [open(path, 'rb', buffering=WRITE_BUFFER_SIZE) for path in paths]
+        try:
+            # Fixed-width keys: byte order is key order
+            for rec in heapq.merge(*shards):
+                out_fp.write(rec[_KEY_PREFIX_LEN:])
+        finally:
+            for f in shards:
+                f.close()
+
+
 def main() -> None:
     args = parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='[%(name)s] %(levelname)s: %(message)s')
 
-    # Open output upfront so we can emit while parsing
+    # Open output upfront so we can emit while parsing (records are UTF-8 bytes)
     if args.out == '-':
-        out_fp = sys.stdout
+        # Own 1 MiB buffer over fd 1 (sys.stdout.buffer only holds 8 KiB);
+        # flush whatever sys.stdout already holds so output stays in order
+        sys.stdout.flush()
+        out_fp = open(sys.stdout.fileno(), 'wb', buffering=WRITE_BUFFER_SIZE, closefd=False)
     else:
-        out_fp = open(args.out, 'w', encoding='utf-8')
+        out_fp = open(args.out, 'wb', buffering=WRITE_BUFFER_SIZE)
 
     meta: Optional[JsonObj] = None
     approx_ctx: Optional[Dict[str, Any]] = None
@@ -78,6 +408,7 @@ def main() -> None:
         try:
             meta = load_meta(args.meta)
         except Exception:
+            logger.debug("failed to load meta from %s", args.meta, exc_info=True)
             meta = None
     # Initialize approximate matcher if requested and meta is available
     if args.approx_match and meta:
@@ -88,6 +419,7 @@ def main() -> None:
             try:
                 import approx_match as _approx_mod  # type: ignore
             except Exception:
+                logger.warning("approximate matching unavailable", exc_info=True)
                 _approx_mod = None  # type: ignore
         if _approx_mod is not None:
             try:
@@ -99,105 +431,20 @@ def main() -> None:
                     'matcher': matcher,
                 }
             except Exception:
+                logger.warning("failed to build approximate matcher", exc_info=True)
                 approx_ctx = None
 
-    tests: Dict[int, TestState] = {}
+    if args.jobs < 1:
+        args.jobs = os.cpu_count() or 1
 
     with open_maybe_gz(args.logs) as fp:
-        for line in fp:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                ev = json.loads(line)
-            except Exception:
-                continue
-
-            ev_type = ev.get('type')
-            test_id = ev.get('test_id')
-            if test_id is None:
-                continue
-
-            st = tests.setdefault(test_id, TestState())
-
-            if ev_type == 'test_start':
-                st.test_info = {
-                    'suite': ev.get('suite'),
-                    'name': ev.get('name'),
-                    'full': ev.get('full'),
-                    'file': ev.get('file'),
-                    'line': ev.get('line'),
-                }
-                st.buffer_prefix.clear()
-                st.open_assert = None
-                st.curr_prefix = []
-                st.oracle_calls.clear()
-                st.inv_cond_all.clear()
-                continue
-
-            if ev_type == 'invocation_start':
-                inv = {
-                    'invocation_id': ev.get('invocation_id'),
-                    'in_oracle': ev.get('in_oracle', 0),
-                    'call_file': ev.get('call_file'),
-                    'call_line': ev.get('call_line'),
-                    'call_expr': ev.get('call_expr'),
-                }
-                if st.open_assert:
-                    if inv['in_oracle']:
-                        st.oracle_calls.append(inv)
-                    else:
-                        # This belongs to the next assertion's prefix
-                        st.buffer_prefix.append(inv)
-                else:
-                    # Before first assertion: part of first prefix
-                    st.buffer_prefix.append(inv)
-                continue
-
-            if ev_type == 'cond':
-                iid = ev.get('invocation_id')
-                if iid is not None:
-                    st.inv_cond_all.setdefault(iid, []).append(ev)
-                continue
-
-            if ev_type == 'assertion':
-                # Emit the previous assertion (closing window)
-                if st.open_assert and st.test_info and should_keep_test(st.test_info, args.suite, args.test_name):
-                    # Filter conds for calls in this assertion window
-                    iids = {c['invocation_id'] for c in st.curr_prefix} | {c['invocation_id'] for c in st.oracle_calls}
-                    inv_cond = {iid: st.inv_cond_all.get(iid, []) for iid in iids}
-                    emit_triple(out_fp, st.test_info, st.open_assert,
-                                st.curr_prefix, st.oracle_calls, inv_cond, args.dedupe_conds, meta, approx_ctx)
-                # Start new assertion window: snapshot current buffer as prefix
-                st.open_assert = ev
-                st.curr_prefix = st.buffer_prefix
-                st.buffer_prefix = []
-                st.oracle_calls = []
-                continue
-
-            if ev_type == 'test_end':
-                # Close any open assertion window on test end
-                if st.open_assert and st.test_info and should_keep_test(st.test_info, args.suite, args.test_name):
-                    iids = {c['invocation_id'] for c in st.curr_prefix} | {c['invocation_id'] for c in st.oracle_calls}
-                    inv_cond = {iid: st.inv_cond_all.get(iid, []) for iid in iids}
-                    emit_triple(out_fp, st.test_info, st.open_assert,
-                                st.curr_prefix, st.oracle_calls, inv_cond, args.dedupe_conds, meta, approx_ctx)
-                st.open_assert = None
-                st.curr_prefix = []
-                st.buffer_prefix.clear()
-                st.oracle_calls.clear()
-                st.inv_cond_all.clear()
-                continue
-
-    # Re-iterate states to flush any assertions not yet emitted (in case logs ended without test_end)
-    for st in tests.values():
-        if st.open_assert and st.test_info and should_keep_test(st.test_info, args.suite, args.test_name):
-            iids = {c['invocation_id'] for c in st.curr_prefix} | {c['invocation_id'] for c in st.oracle_calls}
-            inv_cond = {iid: st.inv_cond_all.get(iid, []) for iid in iids}
-            emit_triple(out_fp, st.test_info, st.open_assert, st.curr_prefix, st.oracle_calls, inv_cond, args.dedupe_conds, meta, approx_ctx)
-
-    if args.out != '-':
-        out_fp.close()
+        if args.jobs == 1:
+            _emit_windows(out_fp, enumerate(fp), _RunContext(args, meta, approx_ctx))
+        else:
+            _run_sharded(fp, out_fp, args, meta, approx_ctx)
+
+    # Flushes the buffer; for '-' fd 1 itself stays open (closefd=False)
+    out_fp.close()
 
 
 if __name__ == '__main__':
@@ -1,56 +1,217 @@
 #!/usr/bin/env python3
-from typing import Dict, Any, List, Optional, Tuple, Set
+from typing import Dict, Any, List, Optional, Tuple
+from bisect import bisect_left
+import sys
+
+try:
+    from ._compress_njit import compress_indices_nb
+except Exception:
+    from _compress_njit import compress_indices_nb  # type: ignore
 
 JsonObj = Dict[str, Any]
 
+# String fields of cond events that repeat across events (same loop head, same
+# function, ...); interned on ingest so they are stored once and compare by identity
+_INTERNED_FIELDS = ('cond_hash', 'func', 'cond_kind', 'file', 'cond_norm')
 
-def effective_val(ev: JsonObj) -> bool:
-    return bool(ev.get('val')) ^ bool(ev.get('norm_flip'))
+# Shorter sequences are compressed in Python; the kernel call costs more there
+_NJIT_MIN_LEN = 32
 
 
-def compress_loop_iterations(conds: List[JsonObj]) -> List[JsonObj]:
-    """Compress repeated loop iterations; drop final exit False if loop entered.
-    Raw val is used to decide loop entry/exit, effective_val is not used here.
+def stamp_cond(ev: JsonObj) -> None:
+    """Precompute the derived fields read on the matching path, once per event.
+
+    '_is_loop': cond_kind is LOOP (case-insensitive); '_eff': val XOR norm_flip.
+    Unstamped events still work everywhere, they are just derived on demand.
+    Repeating string fields are interned in place.
     """
-    n = len(conds)
-    if n <= 1:
-        return list(conds)
-    out: List[JsonObj] = []
-    i = 0
+    for k in _INTERNED_FIELDS:
+        v = ev.get(k)
+        if isinstance(v, str):
+            ev[k] = sys.intern(v)
+    ev['_is_loop'] = (ev.get('cond_kind') or '').upper() == 'LOOP'
+    ev['_eff'] = bool(ev.get('val')) ^ bool(ev.get('norm_flip'))
+
+
+def effective_val(ev: JsonObj) -> bool:
+    try:
+        return ev['_eff']
+    except KeyError:
+        return bool(ev.get('val')) ^ bool(ev.get('norm_flip'))
 
-    def is_loop(ev: JsonObj) -> bool:
+
+def is_loop(ev: JsonObj) -> bool:
+    try:
+        return ev['_is_loop']
+    except KeyError:
         return (ev.get('cond_kind') or '').upper() == 'LOOP'
 
-    while i < n:
-        ev = conds[i]
-        if not is_loop(ev):
-            out.append(ev)
-            i += 1
-            continue
-        loop_hash = ev.get('cond_hash')
-        # raw enter
-        if not bool(ev.get('val')):
-            out.append(ev)
-            i += 1
-            continue
-        # keep first True
-        out.append(ev)
-        # find next loop head occurrence to delimit body
-        j = i + 1
-        while j < n:
-            ej = conds[j]
-            if is_loop(ej) and ej.get('cond_hash') == loop_hash:
+
+def _interned(v: Any) -> Any:
+    return sys.intern(v) if isinstance(v, str) else v
+
+
+class CondColumns:
+    """Cond events of one invocation as parallel columns (struct of arrays).
+
+    A running test keeps its cond events only in this form, so the event
+    dicts themselves are not retained. Loop compression and exact matching
+    run over flat lists/bytearrays (cond_hash, LOOP flag, raw val truthiness,
+    effective value); rows() and events() rebuild the fields records show.
+    Repeating string fields are interned (see _INTERNED_FIELDS).
+    """
+    __slots__ = ('hashes', 'loop', 'val', 'eff', 'file', 'line', 'norm', 'kind', 'raw_val', 'flip', 'func',
+                 '_comp')
+
+    def __init__(self):
+        self.hashes: List[Any] = []
+        self.loop = bytearray()
+        self.val = bytearray()
+        self.eff = bytearray()
+        # The event fields as given (None where absent)
+        self.file: List[Any] = []
+        self.line: List[Any] = []
+        self.norm: List[Any] = []
+        self.kind: List[Any] = []
+        self.raw_val: List[Any] = []
+        self.flip: List[Any] = []
+        self.func: List[Any] = []
+        # (len at compression time, kept indices); see compressed()
+        self._comp: Optional[Tuple[int, List[int]]] = None
+
+    @classmethod
+    def from_events(cls, conds: List[JsonObj]) -> 'CondColumns':
+        cols = cls()
+        for ev in conds:
+            cols.append(ev)
+        return cols
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def append(self, ev: JsonObj) -> None:
+        get = ev.get
+        v = get('val')
+        self.hashes.append(_interned(get('cond_hash')))
+        self.loop.append(is_loop(ev))
+        self.val.append(bool(v))
+        self.eff.append(effective_val(ev))
+        self.file.append(_interned(get('file')))
+        self.line.append(get('line'))
+        self.norm.append(_interned(get('cond_norm')))
+        self.kind.append(_interned(get('cond_kind')))
+        self.raw_val.append(v)
+        self.flip.append(get('norm_flip'))
+        self.func.append(_interned(get('func')))
+
+    def compressed(self) -> List[int]:
+        """Indices kept by loop compression; recomputed only after appends.
+
+        A running test's columns outlive its windows, so an invocation shown
+        in several windows is compressed once unless events arrived between.
+        """
+        if self._comp is None or self._comp[0] != len(self.hashes):
+            self._comp = (len(self.hashes), compress_indices(self))
+        return self._comp[1]
+
+    def rseq_key(self, idx: List[int]) -> Tuple[Tuple[Any, bool], ...]:
+        """(cond_hash, effective val) pairs at idx, as the exact-match key."""
+        hashes = self.hashes
+        eff = self.eff
+        return tuple((hashes[i], eff[i] == 1) for i in idx)
+
+    def first_func(self, idx: Optional[List[int]] = None) -> Optional[str]:
+        """First non-empty func among the events at idx (all events by default)."""
+        func = self.func
+        for i in (range(len(func)) if idx is None else idx):
+            if func[i]:
+                return func[i]
+        return None
+
+    def first_per_hash(self, idx: List[int]) -> List[int]:
+        """The first index in idx of each cond_hash, in first-seen order."""
+        first: Dict[Any, int] = {}
+        setdefault = first.setdefault
+        hashes = self.hashes
+        for i in idx:
+            setdefault(hashes[i], i)
+        return list(first.values())
+
+    def rows(self, idx: List[int]) -> List[JsonObj]:
+        """{file, line, cond_norm, cond_hash, cond_kind, val, flip} per event at idx."""
+        return [{'file': f, 'line': ln, 'cond_norm': n, 'cond_hash': h, 'cond_kind': k, 'val': v, 'flip': fl}
+                for f, ln, n, h, k, v, fl in zip(*([col[i] for i in idx] for col in (
+                    self.file, self.line, self.norm, self.hashes, self.kind, self.raw_val, self.flip)))]
+
+    def events(self, idx: List[int]) -> List[JsonObj]:
+        """The events at idx as stamped cond event dicts (see stamp_cond)."""
+        return [{'file': self.file[i], 'line': self.line[i], 'cond_norm': self.norm[i],
+                 'cond_hash': self.hashes[i], 'cond_kind': self.kind[i], 'val': self.raw_val[i],
+                 'norm_flip': self.flip[i], 'func': self.func[i],
+                 '_is_loop': self.loop[i] == 1, '_eff': self.eff[i] == 1}
+                for i in idx]
+
+
+def compress_indices(cols: CondColumns) -> List[int]:
+    """Indices of the events kept by compress_loop_iterations, from columns.
+
+    Single pass over indices with an explicit stack of pending [lo, hi)
+    ranges instead of recursing on slices: an entered loop head emits itself,
+    then its first-iteration body range, then resumes after the skipped
+    iterations of the enclosing range. Next and last occurrences of a loop
+    head are looked up in positions precomputed by one scan, not searched for.
+    """
+    hashes, loop, val = cols.hashes, cols.loop, cols.val
+    n = len(hashes)
+    if n >= _NJIT_MIN_LEN:
+        kept = compress_indices_nb(hashes, loop, val)
+        if kept is not None:
+            return kept
+    # next_head[i]: next loop event after i with the same cond_hash, n if none
+    next_head = [n] * n
+    last_seen: Dict[Any, int] = {}
+    for p in range(n - 1, -1, -1):
+        if loop[p]:
+            next_head[p] = last_seen.get(hashes[p], n)
+            last_seen[hashes[p]] = p
+    # cond_hash -> ascending positions of its raw-False loop events (exits)
+    exits: Dict[Any, List[int]] = {}
+    for p in range(n):
+        if loop[p] and not val[p]:
+            exits.setdefault(hashes[p], []).append(p)
+
+    out: List[int] = []
+    stack: List[Tuple[int, int]] = [(0, n)]
+    while stack:
+        i, hi = stack.pop()
+        while i < hi:
+            out.append(i)
+            # non-loop events and not-entered loop heads (raw False) are kept as is
+            if not loop[i] or not val[i]:
+                i += 1
+                continue
+            # first True kept; its body runs up to the next occurrence of the head
+            j = min(next_head[i], hi)
+            # skip to after the last raw False for this loop head in [j, hi),
+            # but do not keep it
+            resume = j
+            pos = exits.get(hashes[i])
+            if pos:
+                q = bisect_left(pos, hi) - 1
+                if q >= 0 and pos[q] >= j:
+                    resume = pos[q] + 1
+            if j > i + 1:
+                stack.append((resume, hi))
+                stack.append((i + 1, j))
                 break
-            j += 1
-        if j > i + 1:
-            out.extend(compress_loop_iterations(conds[i + 1:j]))
-        # skip to after last raw False for this loop head, but do not keep it
-        k: Optional[int] = None
-        p = j
-        while p < n:
-            ep = conds[p]
-            if is_loop(ep) and ep.get('cond_hash') == loop_hash and not bool(ep.get('val')):
-                k = p
-            p += 1
-        i = (k + 1) if k is not None else j
+            i = resume
     return out
+
+
+def compress_loop_iterations(conds: List[JsonObj]) -> List[JsonObj]:
+    """Compress repeated loop iterations; drop final exit False if loop entered.
+    Raw val is used to decide loop entry/exit, effective_val is not used here.
+    """
+    if len(conds) <= 1:
+        return list(conds)
+    return [conds[i] for i in compress_indices(CondColumns.from_events(conds))]
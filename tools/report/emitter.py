@@ -1,114 +1,261 @@
 #!/usr/bin/env python3
-from typing import Dict, Any, List, Optional, TextIO, Tuple, Set
+from typing import Dict, Any, List, Optional, BinaryIO, Tuple, Union
+import functools
+import logging
+import operator
 
 JsonObj = Dict[str, Any]
 
+logger = logging.getLogger("brinfo_report")
+
 try:
-    from .cond_utils import effective_val, compress_loop_iterations
+    from .cond_utils import effective_val, CondColumns
+    from .runtime_utils import json_dumps_line, CallColumns, JSON_ITEM_SEP, JSON_KEY_SEP
 except Exception:
-    from cond_utils import effective_val, compress_loop_iterations
+    from cond_utils import effective_val, CondColumns
+    from runtime_utils import json_dumps_line, CallColumns, JSON_ITEM_SEP, JSON_KEY_SEP
+
+
+# Calls of a record: CallColumns, or invocation_start events
+CallList = Union[CallColumns, List[JsonObj]]
+# Conds of one invocation: CondColumns, or cond events
+CondList = Union[CondColumns, List[JsonObj]]
+
+# Output keys of slim_call/slim_cond and the event fields they are read from
+_CALL_KEYS = ('invocation_id', 'call_file', 'call_line', 'call_expr')
+_CALL_GET = operator.itemgetter(*_CALL_KEYS)
+_COND_KEYS = ('file', 'line', 'cond_norm', 'cond_hash', 'cond_kind', 'val', 'flip')
+_COND_FIELDS = ('file', 'line', 'cond_norm', 'cond_hash', 'cond_kind', 'val', 'norm_flip')
+_COND_GET = operator.itemgetter(*_COND_FIELDS)
 
 
 def slim_call(c: JsonObj) -> JsonObj:
-    return {
-        'invocation_id': c.get('invocation_id'),
-        'call_file': c.get('call_file'),
-        'call_line': c.get('call_line'),
-        'call_expr': c.get('call_expr'),
-    }
+    try:
+        return dict(zip(_CALL_KEYS, _CALL_GET(c)))
+    except KeyError:
+        # some field is absent from the event; missing ones become None
+        return {k: c.get(k) for k in _CALL_KEYS}
 
 
 def slim_cond(e: JsonObj) -> JsonObj:
-    return {
-        'file': e.get('file'),
-        'line': e.get('line'),
-        'cond_norm': e.get('cond_norm'),
-        'cond_hash': e.get('cond_hash'),
-        'cond_kind': e.get('cond_kind'),
-        'val': e.get('val'),
-        'flip': e.get('norm_flip'),
-    }
+    try:
+        return dict(zip(_COND_KEYS, _COND_GET(e)))
+    except KeyError:
+        return {k: e.get(f) for k, f in zip(_COND_KEYS, _COND_FIELDS)}
+
+
+# Meta the exact-match cache below was filled from; see _bind_match_meta
+_match_meta: Optional[JsonObj] = None
+# Its exact_chain_index (func_hash -> tuple(hseq) -> [(chain_id, source)]);
+# for a meta without one, the functions indexed so far go to _exact_built
+_exact_index: Optional[Dict[str, Dict[Tuple, List[Tuple[int, str]]]]] = None
+_exact_built: Dict[str, Dict[Tuple, List[Tuple[int, str]]]] = {}
+
+
+def _index_static_chains(static_list: List[Tuple[List[Any], str]]) -> Dict[Tuple, List[Tuple[int, str]]]:
+    """exact_chain_index entry of one function, as load_meta builds it."""
+    exact: Dict[Tuple, List[Tuple[int, str]]] = {}
+    for chain_id, (hseq, source) in enumerate(static_list):
+        try:
+            exact.setdefault(tuple(hseq), []).append((chain_id, source))
+        except TypeError:
+            # unhashable static value; such a chain can never equal a runtime sequence
+            pass
+    return exact
 
 
-def derive_func_and_matches(conds: List[JsonObj], meta: Optional[JsonObj]) -> Tuple[Optional[str], List[JsonObj]]:
-    func_hash = None
+@functools.lru_cache(maxsize=4096)
+def _match_cached(func_hash: str, rseq_key: Tuple[Tuple[Any, bool], ...]) -> Tuple[JsonObj, ...]:
+    """Exact static matches of one compressed runtime sequence.
+
+    Invocations of a function mostly repeat a handful of paths, so the match
+    entries are built once per (func_hash, rseq) and shared between records.
+    """
+    static_list = _match_meta['static_chains_by_func'].get(func_hash, [])
+    if _exact_index is not None:
+        exact = _exact_index.get(func_hash, {})
+    else:
+        exact = _exact_built.get(func_hash)
+        if exact is None:
+            exact = _exact_built[func_hash] = _index_static_chains(static_list)
+    return tuple({'source': source, 'chain_id': chain_id, 'cond_hashes': static_list[chain_id][0]}
+                 for chain_id, source in exact.get(rseq_key, ()))
+
+
+def _bind_match_meta(meta: JsonObj) -> None:
+    """Point the exact-match cache at meta.
+
+    A meta built by hand rather than by load_meta may carry only
+    static_chains_by_func; its functions are then indexed on first lookup.
+    """
+    global _match_meta, _exact_index
+    if meta is not _match_meta:
+        _match_meta = meta
+        _exact_index = meta.get('exact_chain_index')
+        _exact_built.clear()
+        _match_cached.cache_clear()
+
+
+def _slim_calls(calls: CallList) -> List[JsonObj]:
+    if isinstance(calls, CallColumns):
+        return calls.rows()
+    return [slim_call(c) for c in calls]
+
+
+def _first_func(conds: List[JsonObj]) -> Optional[str]:
     for ev in conds:
         fh = ev.get('func')
         if fh:
-            func_hash = fh
-            break
+            return fh
+    return None
+
+
+def _slim_conds(cols: CondColumns, idx: List[int], dedupe_conds: bool) -> List[JsonObj]:
+    """slim_cond of the events at idx; with dedupe_conds, of the first per cond_hash."""
+    if dedupe_conds:
+        idx = cols.first_per_hash(idx)
+    return cols.rows(idx)
+
+
+def derive_func_and_matches(conds_comp: Optional[List[JsonObj]], meta: Optional[JsonObj],
+                            cols: Optional[CondColumns] = None, idx: Optional[List[int]] = None
+                            ) -> Tuple[Optional[str], List[JsonObj]]:
+    """Function hash and exact static matches of an already loop-compressed sequence.
+
+    If the invocation's columns and the kept indices are given instead, the
+    sequence is read from the columns and conds_comp may be None.
+    """
+    if cols is not None and idx is not None:
+        func_hash = cols.first_func(idx)
+        n = len(idx)
+    else:
+        func_hash = _first_func(conds_comp)
+        n = len(conds_comp)
     matches: List[JsonObj] = []
     if func_hash and meta and 'static_chains_by_func' in meta:
-        _c = compress_loop_iterations(conds)
-        rseq = [(e.get('cond_hash'), effective_val(e)) for e in _c]
-        static_list = meta['static_chains_by_func'].get(func_hash, [])
-        chain_id = 0
-        for hseq, source in static_list:
-            if hseq == rseq:
-                matches.append({'source': source, 'chain_id': chain_id, 'cond_hashes': hseq})
-            chain_id += 1
+        # No static chain of this length: skip building the key at all
+        lens_by_func = meta.get('static_lens_by_func')
+        if lens_by_func is not None and n not in lens_by_func.get(func_hash, ()):
+            return func_hash, matches
+        if cols is not None and idx is not None:
+            rseq_key = cols.rseq_key(idx)
+        else:
+            rseq_key = tuple((e.get('cond_hash'), effective_val(e)) for e in conds_comp)
+        _bind_match_meta(meta)
+        matches = list(_match_cached(func_hash, rseq_key))
     return func_hash, matches
 
 
-def emit_triple(out_fp: TextIO, test_info: JsonObj, assert_ev: JsonObj,
-                prefix_calls: List[JsonObj], oracle_calls: List[JsonObj],
-                inv_cond: Dict[int, List[JsonObj]], dedupe_conds: bool,
-                meta: Optional[JsonObj] = None,
-                approx_ctx: Optional[Dict[str, Any]] = None) -> None:
+def _invocation_entry(iid: Any, cols: CondColumns, idx: List[int],
+                      meta: JsonObj, approx_pending: Optional[Dict[str, List[Tuple[JsonObj, List[JsonObj]]]]]
+                      ) -> JsonObj:
+    """invocations[iid] of a record, without approximate matches; idx are the kept indices.
+
+    If approx_pending is given, an entry left without exact matches is queued
+    there under its function as (entry, compressed events); see _add_approx_matches.
+    """
+    func_hash, matches = derive_func_and_matches(None, meta, cols, idx)
+    inv_entry: JsonObj = {}
+    if func_hash:
+        inv_entry['func_hash'] = func_hash
+        if 'functions_by_hash' in meta:
+            finfo = meta['functions_by_hash'].get(func_hash)
+            if isinstance(finfo, dict):
+                sig = finfo.get('signature')
+                if sig:
+                    inv_entry['signature'] = sig
+    if matches:
+        inv_entry['matched_static'] = matches
+    elif approx_pending is not None and func_hash:
+        approx_pending.setdefault(func_hash, []).append((inv_entry, cols.events(idx)))
+    return inv_entry
+
+
+def _add_approx_matches(approx_pending: Dict[str, List[Tuple[JsonObj, List[JsonObj]]]],
+                        approx_ctx: Dict[str, Any]) -> None:
+    """Fill approx_static of the queued entries, one match_batch call per function."""
+    matcher = approx_ctx.get('matcher')
+    if matcher is None:
+        return
+    topk = int(approx_ctx.get('topk', 3))
+    thr = float(approx_ctx.get('threshold', 0.6))
+    for func_hash, queued in approx_pending.items():
+        try:
+            results = matcher.match_batch(func_hash, [conds_comp for _, conds_comp in queued],
+                                          topk=topk, threshold=thr)
+        except Exception:
+            logger.debug("approximate matching failed for function %s", func_hash, exc_info=True)
+            continue
+        for (inv_entry, _), approx in zip(queued, results):
+            if approx:
+                inv_entry['approx_static'] = approx
+
+
+def _test_rec(test_info: JsonObj) -> JsonObj:
+    return {
+        'suite': test_info.get('suite'),
+        'name': test_info.get('name'),
+        'full': test_info.get('full'),
+        'file': test_info.get('file'),
+        'line': test_info.get('line'),
+    }
+
+
+def test_record_head(test_info: JsonObj) -> bytes:
+    """Serialized start of every record of a test, b'{"test":{...}'.
+
+    The test part is the same for all assertions of a test; render_triple
+    splices this in front of the rest instead of serializing it each time.
+    """
+    return b'{"test"' + JSON_KEY_SEP + json_dumps_line(_test_rec(test_info))[:-1]
+
+
+def render_triple(test_info: JsonObj, assert_ev: JsonObj,
+                  prefix_calls: CallList, oracle_calls: CallList,
+                  inv_cond: Dict[int, CondList], dedupe_conds: bool,
+                  meta: Optional[JsonObj] = None,
+                  approx_ctx: Optional[Dict[str, Any]] = None,
+                  emit_chains: bool = True,
+                  test_head: Optional[bytes] = None) -> bytes:
+    """The record of one assertion window as a serialized NDJSON line.
+
+    With emit_chains False, cond_chains is left empty (--no-cond-chains).
+    test_head, if given, is test_record_head(test_info), computed by the caller.
+    """
     cond_chains: Dict[str, List[JsonObj]] = {}
     inv_info: Dict[str, JsonObj] = {}
+    # Invocations still to be matched approximately, grouped by function
+    approx_pending: Optional[Dict[str, List[Tuple[JsonObj, List[JsonObj]]]]] = \
+        {} if approx_ctx and approx_ctx.get('enabled') else None
 
     for iid, conds in inv_cond.items():
-        # Always compress loops for both display and matching
-        conds_comp = compress_loop_iterations(conds)
-        if dedupe_conds:
-            seen: Set[Any] = set()
-            deduped: List[JsonObj] = []
-            for ev in conds_comp:
-                h = ev.get('cond_hash')
-                if h in seen:
-                    continue
-                seen.add(h)
-                deduped.append(slim_cond(ev))
-            cond_chains[str(iid)] = deduped
-            func_hash, matches = derive_func_and_matches(conds_comp, meta)
+        cols = conds if isinstance(conds, CondColumns) else None
+        if not meta and not emit_chains:
+            # Neither displayed nor matched: no need to compress at all
+            func_hash = cols.first_func() if cols is not None else _first_func(conds)  # type: ignore[arg-type]
+            if func_hash:
+                inv_info[str(iid)] = {'func_hash': func_hash}
+            continue
+        if cols is None:
+            cols = CondColumns.from_events(conds)  # type: ignore[arg-type]
+        # Compress loops once for both display and matching; a running test's
+        # columns keep the kept indices for its later windows
+        idx = cols.compressed()
+        if emit_chains:
+            cond_chains[str(iid)] = _slim_conds(cols, idx, dedupe_conds)
+        if meta:
+            inv_entry = _invocation_entry(iid, cols, idx, meta, approx_pending)
         else:
-            cond_chains[str(iid)] = [slim_cond(ev) for ev in conds_comp]
-            func_hash, matches = derive_func_and_matches(conds_comp, meta)
-
-        inv_entry: JsonObj = {}
-        if func_hash:
-            inv_entry['func_hash'] = func_hash
-            if meta and 'functions_by_hash' in meta:
-                finfo = meta['functions_by_hash'].get(func_hash)
-                if isinstance(finfo, dict):
-                    sig = finfo.get('signature')
-                    if sig:
-                        inv_entry['signature'] = sig
-        if matches:
-            inv_entry['matched_static'] = matches
-        elif approx_ctx and approx_ctx.get('enabled') and meta:
-            try:
-                matcher = approx_ctx.get('matcher')
-                if matcher is not None:
-                    topk = int(approx_ctx.get('topk', 3))
-                    thr = float(approx_ctx.get('threshold', 0.6))
-                    approx = matcher.match(func_hash, conds_comp, topk=topk, threshold=thr)
-                    if approx:
-                        inv_entry['approx_static'] = approx
-            except Exception:
-                pass
+            # No static meta: nothing to match or enrich, only the function hash
+            func_hash = cols.first_func(idx)
+            inv_entry = {'func_hash': func_hash} if func_hash else {}
         if inv_entry:
             inv_info[str(iid)] = inv_entry
+    if approx_pending:
+        _add_approx_matches(approx_pending, approx_ctx)  # type: ignore[arg-type]
 
-    rec = {
-        'test': {
-            'suite': test_info.get('suite'),
-            'name': test_info.get('name'),
-            'full': test_info.get('full'),
-            'file': test_info.get('file'),
-            'line': test_info.get('line'),
-        },
+    rec: JsonObj = {} if test_head is not None else {'test': _test_rec(test_info)}
+    rec.update({
         'assertion': {
             'assert_id': assert_ev.get('assert_id'),
             'macro': assert_ev.get('macro'),
@@ -116,9 +263,23 @@ def emit_triple(out_fp: TextIO, test_info: JsonObj, assert_ev: JsonObj,
             'line': assert_ev.get('line'),
             'raw': assert_ev.get('raw'),
         },
-        'prefix': [slim_call(c) for c in prefix_calls],
-        'oracle_calls': [slim_call(c) for c in oracle_calls],
+        'prefix': _slim_calls(prefix_calls),
+        'oracle_calls': _slim_calls(oracle_calls),
         'cond_chains': cond_chains,
         'invocations': inv_info,
-    }
-    out_fp.write(__import__('json').dumps(rec, ensure_ascii=False) + '\n')
+    })
+    if test_head is None:
+        return json_dumps_line(rec)
+    # b'{"assertion":...}\n' -> test_head + b',"assertion":...}\n'
+    return test_head + JSON_ITEM_SEP + json_dumps_line(rec)[1:]
+
+
+def emit_triple(out_fp: BinaryIO, test_info: JsonObj, assert_ev: JsonObj,
+                prefix_calls: CallList, oracle_calls: CallList,
+                inv_cond: Dict[int, CondList], dedupe_conds: bool,
+                meta: Optional[JsonObj] = None,
+                approx_ctx: Optional[Dict[str, Any]] = None,
+                emit_chains: bool = True,
+                test_head: Optional[bytes] = None) -> None:
+    out_fp.write(render_triple(test_info, assert_ev, prefix_calls, oracle_calls, inv_cond, dedupe_conds,
+                               meta, approx_ctx, emit_chains=emit_chains, test_head=test_head))
@@ -1,35 +1,39 @@
 #!/usr/bin/env python3
-from typing import Dict, Any, List, Optional, Tuple
-import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Set, Tuple
+import logging
 import os
 import sys
 
+try:
+    from .runtime_utils import json_loads
+except Exception:
+    from runtime_utils import json_loads  # type: ignore
+
 JsonObj = Dict[str, Any]
 
+logger = logging.getLogger("brinfo_report")
 
-def load_meta(meta_dir: str) -> JsonObj:
-    functions_by_hash: Dict[str, JsonObj] = {}
-    conditions_by_hash: Dict[str, JsonObj] = {}
-    conditions_by_id: Dict[int, JsonObj] = {}
-    static_chains_by_func: Dict[str, List[Tuple[List[str], str]]] = {}
 
-    analysis_versions: Dict[str, Optional[str]] = {
-        'functions': None,
-        'conditions': None,
-        'chains': None,
-    }
+def _read_json(path: str) -> Any:
+    # One read of the raw bytes, parsed whole (orjson when installed, see
+    # runtime_utils); the read is a single call that releases the GIL for
+    # the pool's sake
+    with open(path, 'rb') as f:
+        data = f.read()
+    return json_loads(data)
 
-    def add_chain(func_hash: Optional[str], cond_hashes: List[str], source: str) -> None:
-        if not func_hash:
-            return
-        static_chains_by_func.setdefault(func_hash, []).append((cond_hashes, source))
 
+def _load_conditions(meta_dir: str) -> Tuple[Optional[str], Dict[int, JsonObj], Dict[str, JsonObj]]:
+    """Parse conditions.meta.json -> (analysis_version, by id, by hash)."""
+    version = None
+    conditions_by_id: Dict[int, JsonObj] = {}
+    conditions_by_hash: Dict[str, JsonObj] = {}
     path = os.path.join(meta_dir, "conditions.meta.json")
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = _read_json(path)
         if isinstance(data, dict):
-            analysis_versions['conditions'] = data.get('analysis_version')
+            version = data.get('analysis_version')
             items = data.get('conditions') or []
             if isinstance(items, list):
                 for item in items:
@@ -42,24 +46,92 @@ def load_meta(meta_dir: str) -> JsonObj:
                     if ch:
                         conditions_by_hash[str(ch)] = item
     except Exception:
-        pass
+        logger.debug("skipping unreadable meta file %s", path, exc_info=True)
+    return version, conditions_by_id, conditions_by_hash
+
+
+def _load_chains(meta_dir: str) -> Tuple[Optional[str], List[JsonObj]]:
+    """Parse chains.meta.json -> (analysis_version, raw chain entries).
 
+    Entries still reference conditions by cond_id; load_meta resolves them
+    once conditions.meta.json is loaded too.
+    """
+    version = None
+    seqs: List[JsonObj] = []
     path = os.path.join(meta_dir, "chains.meta.json")
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        seqs: List[JsonObj] = []
+        data = _read_json(path)
         if isinstance(data, dict):
-            analysis_versions['chains'] = data.get('analysis_version')
+            version = data.get('analysis_version')
             seqs = data.get('chains') or []
         elif isinstance(data, list):
             seqs = data
-        else:
-            seqs = []
+    except Exception:
+        logger.debug("skipping unreadable meta file %s", path, exc_info=True)
+    return version, seqs
+
+
+def _load_functions(meta_dir: str) -> Tuple[Optional[str], Dict[str, JsonObj]]:
+    """Parse functions.meta.json -> (analysis_version, by hash)."""
+    version = None
+    functions_by_hash: Dict[str, JsonObj] = {}
+    path = os.path.join(meta_dir, "functions.meta.json")
+    try:
+        data = _read_json(path)
+        if isinstance(data, dict):
+            version = data.get('analysis_version')
+            items = data.get('functions') or []
+            if isinstance(items, list):
+                for item in items:
+                    if isinstance(item, dict):
+                        fh = item.get('hash')
+                        if fh:
+                            functions_by_hash[str(fh)] = item
+    except Exception:
+        logger.debug("skipping unreadable meta file %s", path, exc_info=True)
+    return version, functions_by_hash
+
+
+def load_meta(meta_dir: str) -> JsonObj:
+    static_chains_by_func: Dict[str, List[Tuple[List[str], str]]] = {}
+    # func_hash -> tuple(hseq) -> [(chain_id, source), ...] for O(1) exact matching;
+    # chain_id indexes into static_chains_by_func[func_hash]
+    exact_chain_index: Dict[str, Dict[Tuple, List[Tuple[int, str]]]] = {}
+    # func_hash -> lengths of its static chains; sequences of other lengths
+    # cannot match exactly, so no lookup key is built for them
+    static_lens_by_func: Dict[str, Set[int]] = {}
+
+    def add_chain(func_hash: Optional[str], cond_hashes: List[str], source: str) -> None:
+        if not func_hash:
+            return
+        chains = static_chains_by_func.setdefault(func_hash, [])
+        chain_id = len(chains)
+        chains.append((cond_hashes, source))
+        static_lens_by_func.setdefault(func_hash, set()).add(len(cond_hashes))
+        try:
+            exact_chain_index.setdefault(func_hash, {}).setdefault(tuple(cond_hashes), []).append((chain_id, source))
+        except TypeError:
+            # unhashable static value; such a chain can never equal a runtime sequence
+            pass
+
+    # The three files are independent to read and parse, so overlap them
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        chains_f = pool.submit(_load_chains, meta_dir)
+        conds_f = pool.submit(_load_conditions, meta_dir)
+        funcs_f = pool.submit(_load_functions, meta_dir)
+        av_conds, conditions_by_id, conditions_by_hash = conds_f.result()
+        av_chains, seqs = chains_f.result()
+        av_funcs, functions_by_hash = funcs_f.result()
+
+    # Resolve chain cond_ids against the conditions (needs both files)
+    path = os.path.join(meta_dir, "chains.meta.json")
+    try:
         for ch in seqs:
             if not isinstance(ch, dict):
                 continue
             fh = ch.get('func_hash') or ch.get('func')
+            if isinstance(fh, str):
+                fh = sys.intern(fh)
             conds_raw = ch.get('sequence') or []
             hseq: List[str] = []
             for c in conds_raw:
@@ -72,39 +144,22 @@ def load_meta(meta_dir: str) -> JsonObj:
                     if info:
                         h = info.get('hash')
                         if h:
-                            hseq.append((str(h), cval))
+                            hseq.append((sys.intern(str(h)), cval))
             add_chain(str(fh) if fh else None, hseq, path)
     except Exception:
-        pass
-
-    path = os.path.join(meta_dir, "functions.meta.json")
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        if isinstance(data, dict):
-            analysis_versions['functions'] = data.get('analysis_version')
-            items = data.get('functions') or []
-            if isinstance(items, list):
-                for item in items:
-                    if isinstance(item, dict):
-                        fh = item.get('hash')
-                        if fh:
-                            functions_by_hash[str(fh)] = item
-    except Exception:
-        pass
+        logger.debug("stopped resolving malformed chains in %s", path, exc_info=True)
 
-    av_funcs = analysis_versions.get('functions')
-    av_conds = analysis_versions.get('conditions')
-    av_chains = analysis_versions.get('chains')
     if av_funcs and av_conds and av_chains:
         if not (av_funcs == av_conds == av_chains):
-            sys.stderr.write(
-                f"[brinfo_report] warning: meta analysis_version mismatch: "
-                f"functions={av_funcs}, conditions={av_conds}, chains={av_chains}\n"
+            logger.warning(
+                "meta analysis_version mismatch: functions=%s, conditions=%s, chains=%s",
+                av_funcs, av_conds, av_chains,
             )
 
     return {
         'functions_by_hash': functions_by_hash,
         'conditions_by_hash': conditions_by_hash,
         'static_chains_by_func': static_chains_by_func,
+        'exact_chain_index': exact_chain_index,
+        'static_lens_by_func': static_lens_by_func,
     }
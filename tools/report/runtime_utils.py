@@ -1,32 +1,212 @@
 #!/usr/bin/env python3
-from typing import Dict, Any, List, Optional, TextIO
+from typing import Dict, Any, Callable, List, Optional, BinaryIO
 import gzip
 import io
+import json
+import sys
+import threading
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is the fallback
+    orjson = None  # type: ignore
+
+try:
+    import ujson
+except ImportError:  # optional; second choice when orjson is missing
+    ujson = None  # type: ignore
+
+try:
+    import simdjson
+except ImportError:  # optional; parses input when orjson is missing
+    simdjson = None  # type: ignore
+
+try:
+    # ISA-L accelerated inflate, drop-in for gzip.GzipFile
+    from isal.igzip import IGzipFile as _GzipFile
+except ImportError:  # optional; stdlib gzip (zlib) is the fallback
+    _GzipFile = gzip.GzipFile  # type: ignore
+
+try:
+    from .cond_utils import CondColumns
+except Exception:
+    from cond_utils import CondColumns  # type: ignore
 
 JsonObj = Dict[str, Any]
 
+# Read buffer for log input (bytes); large reads keep syscalls/decompress calls few
+READ_BUFFER_SIZE = 1 << 20
+
+# Separators json_dumps_line puts between items and after keys, for callers
+# splicing serialized parts into a line; orjson and ujson write compact JSON
+JSON_ITEM_SEP = b','
+JSON_KEY_SEP = b':'
+
+if orjson is not None:
+    json_loads = orjson.loads
+
+    def json_dumps_line(obj: Any) -> bytes:
+        """Serialize obj as one UTF-8 NDJSON line (trailing newline included)."""
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+elif ujson is not None:
+    # ujson.loads accepts UTF-8 bytes as well
+    json_loads = ujson.loads
+
+    def json_dumps_line(obj: Any) -> bytes:
+        """Serialize obj as one UTF-8 NDJSON line (trailing newline included)."""
+        return (ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False) + '\n').encode('utf-8')
+else:
+    # json.loads accepts UTF-8 bytes directly
+    json_loads = json.loads
+    JSON_ITEM_SEP = b', '
+    JSON_KEY_SEP = b': '
+
+    def json_dumps_line(obj: Any) -> bytes:
+        """Serialize obj as one UTF-8 NDJSON line (trailing newline included)."""
+        return (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+
+if orjson is None and simdjson is not None:
+    # One parser per thread (meta files are parsed on a pool), reused for
+    # every document; documents are copied out as plain dicts/lists, since
+    # events are kept and stamped after the next parse
+    _simdjson_local = threading.local()
+
+    def json_loads(data: bytes) -> Any:  # type: ignore[no-redef]
+        try:
+            parser = _simdjson_local.parser
+        except AttributeError:
+            parser = _simdjson_local.parser = simdjson.Parser()
+        doc = parser.parse(data)
+        if isinstance(doc, simdjson.Object):
+            return doc.as_dict()
+        if isinstance(doc, simdjson.Array):
+            return doc.as_list()
+        return doc
+
+
+class _OwningBufferedReader(io.BufferedReader):
+    """BufferedReader over a stream that also closes the file beneath it.
+
+    GzipFile(fileobj=...) leaves the file object it was given open.
+    """
+
+    def __init__(self, stream: Any, owned: Any):
+        super().__init__(stream, buffer_size=READ_BUFFER_SIZE)
+        self._owned = owned
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._owned.close()
+
+
+def open_maybe_gz(path: str) -> BinaryIO:
+    """Open a file that may be gzip-compressed (by .gz suffix) for binary reading.
 
-def open_maybe_gz(path: str) -> TextIO:
-    """Open a text file that may be gzip-compressed (by .gz suffix)."""
+    Lines are yielded as bytes and handed to json_loads without decoding first.
+    Both variants read through a READ_BUFFER_SIZE buffer; for .gz input it sits
+    on top of the decompressor so lines are split out of large decoded blocks.
+    """
     if path.endswith('.gz'):
-        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8')
-    return open(path, 'r', encoding='utf-8')
+        # Double buffering: large reads of compressed bytes below the
+        # decompressor, large reads of decompressed bytes above it
+        raw = open(path, 'rb', buffering=READ_BUFFER_SIZE)
+        try:
+            gz = _GzipFile(fileobj=raw, mode='rb')
+        except Exception:
+            raw.close()
+            raise
+        return _OwningBufferedReader(gz, raw)  # type: ignore[return-value]
+    return open(path, 'rb', buffering=READ_BUFFER_SIZE)
+
+
+class CallColumns:
+    """invocation_start events of a call list as parallel columns (struct of arrays).
+
+    Only the fields a record shows are kept, so the event dicts themselves
+    are not retained; rows() rebuilds the record's call entries. call_file
+    and call_expr repeat across calls and are interned.
+    """
+    __slots__ = ('invocation_id', 'call_file', 'call_line', 'call_expr')
+
+    def __init__(self):
+        self.invocation_id: List[Any] = []
+        self.call_file: List[Any] = []
+        self.call_line: List[Any] = []
+        self.call_expr: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.invocation_id)
+
+    def append(self, ev: JsonObj) -> None:
+        get = ev.get
+        self.invocation_id.append(get('invocation_id'))
+        f = get('call_file')
+        e = get('call_expr')
+        self.call_file.append(sys.intern(f) if isinstance(f, str) else f)
+        self.call_line.append(get('call_line'))
+        self.call_expr.append(sys.intern(e) if isinstance(e, str) else e)
+
+    def clear(self) -> None:
+        self.invocation_id.clear()
+        self.call_file.clear()
+        self.call_line.clear()
+        self.call_expr.clear()
+
+    def rows(self) -> List[JsonObj]:
+        """{invocation_id, call_file, call_line, call_expr} per call, in order."""
+        return [{'invocation_id': i, 'call_file': f, 'call_line': ln, 'call_expr': e}
+                for i, f, ln, e in zip(self.invocation_id, self.call_file, self.call_line, self.call_expr)]
 
 
 class TestState:
+    __slots__ = ('buffer_prefix', 'curr_prefix', 'open_assert', 'oracle_calls', 'inv_conds',
+                 'buffer_prefix_iids', 'curr_prefix_iids', 'oracle_iids', 'test_info', 'dropped', 'test_head')
+
     def __init__(self):
-        # Buffer of invocations (in_oracle=0) since last cut (test_start or last assertion)
-        self.buffer_prefix: List[JsonObj] = []
+        # Buffer of invocation_start events (in_oracle=0) since last cut (test_start or last assertion)
+        self.buffer_prefix = CallColumns()
         # For the currently open assertion, its prefix snapshot captured at assertion event
-        self.curr_prefix: List[JsonObj] = []
+        self.curr_prefix = CallColumns()
         # Current assertion event
         self.open_assert: Optional[JsonObj] = None
-        # Invocations with in_oracle=1 in current assertion window
-        self.oracle_calls: List[JsonObj] = []
-        # Accumulate all cond events by invocation across the test
-        self.inv_cond_all: Dict[int, List[JsonObj]] = {}
+        # invocation_start events with in_oracle=1 in current assertion window
+        self.oracle_calls = CallColumns()
+        # Cond events of the test per invocation, in arrival order, as columns;
+        # the only copy of them that is kept
+        self.inv_conds: Dict[int, CondColumns] = {}
+        # invocation_ids of buffer_prefix/curr_prefix/oracle_calls, maintained as
+        # calls are buffered; dicts used as insertion-ordered sets (values None)
+        self.buffer_prefix_iids: Dict[Any, None] = {}
+        self.curr_prefix_iids: Dict[Any, None] = {}
+        self.oracle_iids: Dict[Any, None] = {}
         # From test_start
         self.test_info: Optional[JsonObj] = None
+        # Test rejected by --suite/--test at test_start: its events are skipped
+        # until the next test_start for this test_id
+        self.dropped = False
+        # Serialized head of this test's records (emitter.test_record_head),
+        # built at the first emit
+        self.test_head: Optional[bytes] = None
+
+    def add_cond(self, iid: int, ev: JsonObj) -> None:
+        cols = self.inv_conds.get(iid)
+        if cols is None:
+            cols = self.inv_conds[iid] = CondColumns()
+        cols.append(ev)
+
+    def conds_of(self, iid: int) -> CondColumns:
+        """Cond events of one invocation, in arrival order; read-only."""
+        cols = self.inv_conds.get(iid)
+        return cols if cols is not None else _NO_CONDS
+
+    def clear_conds(self) -> None:
+        self.inv_conds = {}
+
+
+# conds_of() of an invocation without cond events
+_NO_CONDS = CondColumns()
 
 
 def should_keep_test(test_info: Optional[JsonObj], suite_filter: Optional[str], name_filter: Optional[str]) -> bool:
@@ -37,3 +217,13 @@ def should_keep_test(test_info: Optional[JsonObj], suite_filter: Optional[str],
     if name_filter and name_filter not in test_info.get('name', '') and name_filter not in test_info.get('full', ''):
         return False
     return True
+
+
+def build_test_filter(suite_filter: Optional[str], name_filter: Optional[str]) -> Callable[[Optional[JsonObj]], bool]:
+    """should_keep_test with the filters bound once; trivially True without filters."""
+    if not suite_filter and not name_filter:
+        return lambda test_info: True
+
+    def keep_test(test_info: Optional[JsonObj]) -> bool:
+        return should_keep_test(test_info, suite_filter, name_filter)
+    return keep_test
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import runtime_utils  # noqa: E402
+
+
+def _cond(cond_hash, kind, val):
+    return {'invocation_id': 1, 'func': 'F1', 'cond_hash': cond_hash, 'cond_kind': kind, 'val': val}
+
+
+class CompressionReuseTest(unittest.TestCase):
+    def test_columns_reuse_compression_until_new_events(self):
+        st = runtime_utils.TestState()
+        for ev in (_cond('L', 'LOOP', 1), _cond('b', 'IF', 1), _cond('L', 'LOOP', 1),
+                   _cond('b', 'IF', 1), _cond('L', 'LOOP', 0)):
+            st.add_cond(1, ev)
+        # Two windows listing invocation 1 read the same columns and kept indices
+        first = st.conds_of(1).compressed()
+        self.assertEqual(first, [0, 1])
+        self.assertIs(st.conds_of(1).compressed(), first)
+        # An event arriving in between invalidates the cached indices
+        st.add_cond(1, _cond('c', 'IF', 0))
+        self.assertEqual(st.conds_of(1).compressed(), [0, 1, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import emitter  # noqa: E402
+
+
+def _cond(cond_hash, val):
+    return {'func': 'F1', 'cond_hash': cond_hash, 'cond_kind': 'IF', 'val': val}
+
+
+class DeriveFuncAndMatchesTest(unittest.TestCase):
+    def test_meta_with_only_static_chains(self):
+        # Hand-built meta: no exact_chain_index / static_lens_by_func from load_meta
+        meta = {'static_chains_by_func': {'F1': [
+            ([('h1', True), ('h2', False)], 'a.json'),
+            ([('h1', True)], 'a.json'),
+        ]}}
+        func_hash, matches = emitter.derive_func_and_matches([_cond('h1', 1), _cond('h2', 0)], meta)
+        self.assertEqual(func_hash, 'F1')
+        self.assertEqual(matches, [{'source': 'a.json', 'chain_id': 0,
+                                    'cond_hashes': [('h1', True), ('h2', False)]}])
+        self.assertEqual(emitter.derive_func_and_matches([_cond('h2', 1)], meta)[1], [])
+
+    def test_meta_with_exact_chain_index(self):
+        hseq = [('h1', True)]
+        meta = {'static_chains_by_func': {'F1': [(hseq, 'b.json')]},
+                'exact_chain_index': {'F1': {tuple(hseq): [(0, 'b.json')]}}}
+        _, matches = emitter.derive_func_and_matches([_cond('h1', 1)], meta)
+        self.assertEqual(matches, [{'source': 'b.json', 'chain_id': 0, 'cond_hashes': hseq}])
+
+
+if __name__ == '__main__':
+    unittest.main()